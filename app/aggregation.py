@@ -0,0 +1,334 @@
+import argparse
+import bisect
+import logging
+import os
+import re
+import ujson
+
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Iterable, List
+
+from reanalyze import iter_json_files
+from transcript_io import load_transcript
+
+
+# Limites (palavras por minuto) das faixas do histograma de WPM.
+WPM_BUCKETS = [60, 90, 120, 150, 180, 210, 240]
+
+
+class WordSketch:
+    """Resumo Misra-Gries das palavras mais frequentes, com no máximo `k` contadores.
+
+    Resumos de partes diferentes do corpus podem ser combinados (`merge`)
+    mantendo o mesmo limite de tamanho e erro, o que permite agregar em
+    paralelo e de forma incremental.
+    """
+
+    def __init__(self, k: int = 512, counters: dict = None):
+        self.k = k
+        self.counters = Counter(counters or {})
+
+    def _prune(self) -> None:
+        if len(self.counters) <= self.k:
+            return
+        threshold = sorted(self.counters.values(), reverse=True)[self.k]
+        self.counters = Counter(
+            {word: count - threshold for word, count in self.counters.items() if count > threshold}
+        )
+
+    def update(self, counts: dict) -> None:
+        self.counters.update(counts)
+        self._prune()
+
+    def merge(self, other: "WordSketch") -> "WordSketch":
+        self.counters.update(other.counters)
+        self._prune()
+        return self
+
+    def top(self, n: int = 10) -> list:
+        return self.counters.most_common(n)
+
+
+class PartialAggregate:
+    """Agregado parcial e combinável das métricas de várias ligações."""
+
+    def __init__(self, sketch_size: int = 512):
+        self.calls = 0
+        self.total_words = 0
+        self.wpm_sum = 0.0
+        self.wpm_histogram = [0] * (len(WPM_BUCKETS) + 1)
+        self.magic_words = Counter()
+        self.words = WordSketch(sketch_size)
+
+    def add(self, data: dict) -> None:
+        """Inclui uma ligação (JSON de resultado) no agregado."""
+        metrics = data.get("metrics", {})
+        total_words = metrics.get("total_words", 0)
+        wpm = metrics.get("words_per_minute", 0)
+        self.calls += 1
+        self.total_words += total_words
+        self.wpm_sum += wpm
+        self.wpm_histogram[bisect.bisect_right(WPM_BUCKETS, wpm)] += 1
+        # Percentuais por ligação são convertidos de volta em contagens.
+        for word, percentage in metrics.get("magic_word_percentages", {}).items():
+            self.magic_words[word] += round(percentage * total_words / 100)
+        # O resumo recebe todas as palavras da ligação (como em
+        # `analyze_transcription`), não só as 10 mais frequentes.
+        self.words.update(
+            Counter(
+                word
+                for segment in data.get("transcription", [])
+                for word in segment["transcription"].lower().split()
+            )
+        )
+
+    def merge(self, other: "PartialAggregate") -> "PartialAggregate":
+        self.calls += other.calls
+        self.total_words += other.total_words
+        self.wpm_sum += other.wpm_sum
+        self.wpm_histogram = [a + b for a, b in zip(self.wpm_histogram, other.wpm_histogram)]
+        self.magic_words.update(other.magic_words)
+        self.words.merge(other.words)
+        return self
+
+    def to_dict(self) -> dict:
+        """Documento compacto de rollup (também aceito por `from_dict`)."""
+        return {
+            "calls": self.calls,
+            "total_words": self.total_words,
+            "wpm_sum": self.wpm_sum,
+            "avg_words_per_minute": self.wpm_sum / self.calls if self.calls else 0,
+            "wpm_buckets": WPM_BUCKETS,
+            "wpm_histogram": self.wpm_histogram,
+            "magic_words": dict(self.magic_words),
+            "magic_word_percentages": {
+                word: (count / self.total_words) * 100 if self.total_words else 0
+                for word, count in self.magic_words.items()
+            },
+            "top_words": self.words.top(50),
+            "word_sketch": {"k": self.words.k, "counters": dict(self.words.counters)},
+        }
+
+    @classmethod
+    def from_dict(cls, document: dict) -> "PartialAggregate":
+        sketch = document.get("word_sketch", {})
+        aggregate = cls(sketch.get("k", 512))
+        aggregate.calls = document["calls"]
+        aggregate.total_words = document["total_words"]
+        aggregate.wpm_sum = document["wpm_sum"]
+        aggregate.wpm_histogram = list(document["wpm_histogram"])
+        aggregate.magic_words = Counter(document["magic_words"])
+        aggregate.words = WordSketch(aggregate.words.k, sketch.get("counters"))
+        return aggregate
+
+
+class Rollup:
+    """Agregados parciais por dimensão: total, por dia e por atendente."""
+
+    def __init__(self, sketch_size: int = 512):
+        self.sketch_size = sketch_size
+        self.groups = {}
+
+    def _group(self, dimension: str, key: str) -> PartialAggregate:
+        group_key = (dimension, key)
+        if group_key not in self.groups:
+            self.groups[group_key] = PartialAggregate(self.sketch_size)
+        return self.groups[group_key]
+
+    def add(self, data: dict, day: str, agent: str) -> None:
+        self._group("all", "all").add(data)
+        self._group("day", day).add(data)
+        self._group("agent", agent).add(data)
+
+    def merge(self, other: "Rollup") -> "Rollup":
+        for group_key, aggregate in other.groups.items():
+            if group_key in self.groups:
+                self.groups[group_key].merge(aggregate)
+            else:
+                self.groups[group_key] = aggregate
+        return self
+
+    def documents(self) -> List[dict]:
+        return [
+            {"id": f"{dimension}:{key}", "dimension": dimension, "key": key, **aggregate.to_dict()}
+            for (dimension, key), aggregate in sorted(self.groups.items())
+        ]
+
+    @classmethod
+    def from_documents(cls, documents: Iterable[dict], sketch_size: int = 512) -> "Rollup":
+        rollup = cls(sketch_size)
+        for document in documents:
+            rollup.groups[(document["dimension"], document["key"])] = PartialAggregate.from_dict(
+                document
+            )
+        return rollup
+
+
+def call_day(
+    data: dict, json_file: str, date_pattern: str = None, date_format: str = "%Y%m%d"
+) -> str:
+    """Dia da ligação.
+
+    Usa o grupo 1 de `date_pattern` no nome do áudio (lido com `date_format`);
+    sem ele, o `execution_date` gravado na transcrição e, por último, a data do
+    arquivo (que muda quando o `reanalyze` regrava o resultado).
+    """
+    if date_pattern:
+        match = re.search(date_pattern, os.path.basename(data.get("audio_path", "")))
+        if match:
+            try:
+                return datetime.strptime(match.group(1), date_format).strftime("%Y-%m-%d")
+            except ValueError:
+                logging.warning(f"Data inválida no nome de {data.get('audio_path')}: {match.group(1)}")
+    if data.get("execution_date"):
+        return data["execution_date"][:10]
+    return datetime.fromtimestamp(os.path.getmtime(json_file)).strftime("%Y-%m-%d")
+
+
+def call_agent(data: dict, agent_pattern: str = None) -> str:
+    """Atendente da ligação: campo `agent` ou o grupo 1 de `agent_pattern` no nome do áudio."""
+    if data.get("agent"):
+        return str(data["agent"])
+    if agent_pattern:
+        match = re.search(agent_pattern, os.path.basename(data.get("audio_path", "")))
+        if match:
+            return match.group(1)
+    return "unknown"
+
+
+def aggregate_files(
+    json_files: List[str],
+    agent_pattern: str = None,
+    sketch_size: int = 512,
+    date_pattern: str = None,
+    date_format: str = "%Y%m%d",
+) -> Rollup:
+    """Agrega um bloco de JSONs de resultado em um `Rollup` parcial."""
+    rollup = Rollup(sketch_size)
+    for json_file in json_files:
+        try:
+            data = load_transcript(json_file)
+            rollup.add(
+                data,
+                call_day(data, json_file, date_pattern, date_format),
+                call_agent(data, agent_pattern),
+            )
+        except Exception as e:
+            logging.error(f"Erro ao agregar {json_file}: {e}")
+    return rollup
+
+
+def _chunks(items: Iterable[str], size: int) -> Iterable[List[str]]:
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def build_rollup(
+    json_path: str,
+    workers: int = 1,
+    chunk_size: int = 500,
+    agent_pattern: str = None,
+    sketch_size: int = 512,
+    base: Rollup = None,
+    date_pattern: str = None,
+    date_format: str = "%Y%m%d",
+) -> Rollup:
+    """Agrega todos os JSONs de um diretório em paralelo, opcionalmente sobre um rollup anterior."""
+    rollup = base or Rollup(sketch_size)
+    chunks = _chunks(iter_json_files(json_path), chunk_size)
+    if workers <= 1:
+        for chunk in chunks:
+            rollup.merge(
+                aggregate_files(chunk, agent_pattern, sketch_size, date_pattern, date_format)
+            )
+        return rollup
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(
+                aggregate_files, chunk, agent_pattern, sketch_size, date_pattern, date_format
+            )
+            for chunk in chunks
+        ]
+        for future in futures:
+            rollup.merge(future.result())
+    return rollup
+
+
+def load_rollup(rollup_file: str, sketch_size: int = 512) -> Rollup:
+    with open(rollup_file, "r", encoding="utf-8") as f:
+        return Rollup.from_documents(ujson.load(f), sketch_size)
+
+
+def save_rollup(rollup_file: str, rollup: Rollup) -> None:
+    os.makedirs(os.path.dirname(rollup_file) or ".", exist_ok=True)
+    tmp_file = rollup_file + ".tmp"
+    with open(tmp_file, "w", encoding="utf-8") as f:
+        ujson.dump(rollup.documents(), f, ensure_ascii=False)
+    os.replace(tmp_file, rollup_file)
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(
+        description="Agrega as métricas de NPS de várias ligações em documentos de rollup"
+    )
+    parser.add_argument(
+        "--json_path", default="./json_files", help="Diretório com os JSONs de transcrição"
+    )
+    parser.add_argument(
+        "--output", default="./rollups/rollup.json", help="Arquivo de rollup a ser gravado"
+    )
+    parser.add_argument(
+        "--merge",
+        nargs="*",
+        default=[],
+        help="Rollups existentes a combinar com o resultado (agregação incremental)",
+    )
+    parser.add_argument(
+        "--agent_pattern",
+        help="Regex cujo grupo 1 extrai o atendente do nome do áudio (ex.: '^(\\w+)_')",
+    )
+    parser.add_argument(
+        "--date_pattern",
+        help="Regex cujo grupo 1 extrai a data da ligação do nome do áudio (ex.: '_(\\d{8})_')",
+    )
+    parser.add_argument(
+        "--date_format", default="%Y%m%d", help="Formato (strptime) da data de --date_pattern"
+    )
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--chunk_size", type=int, default=500, help="Arquivos por tarefa")
+    parser.add_argument(
+        "--sketch_size", type=int, default=512, help="Contadores do resumo de palavras"
+    )
+    args = parser.parse_args(argv)
+
+    base = Rollup(args.sketch_size)
+    for rollup_file in args.merge:
+        base.merge(load_rollup(rollup_file, args.sketch_size))
+
+    rollup = build_rollup(
+        args.json_path,
+        args.workers,
+        args.chunk_size,
+        args.agent_pattern,
+        args.sketch_size,
+        base,
+        args.date_pattern,
+        args.date_format,
+    )
+    save_rollup(args.output, rollup)
+    message = f"Rollup salvo em {args.output} com {len(rollup.groups)} grupos"
+    logging.info(message)
+    print(message)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+from collections import Counter
+from typing import Iterable, List
+
+from magic_words import MagicWordMatcher, load_matcher
+
+
+# Métricas de tempo medidas no áudio (VAD), preservadas ao reanalisar um JSON.
+TIMING_KEYS = (
+    "audio_seconds",
+    "speech_seconds",
+    "silence_seconds",
+    "speech_ratio",
+    "talk_over_seconds",
+    "talk_over_count",
+)
+
+# Pausa máxima (segundos) entre palavras de um mesmo turno de fala.
+TURN_GAP_SECONDS = 1.0
+
+
+def empty_metrics() -> dict:
+    """Bloco de métricas de uma transcrição sem palavras."""
+    return {
+        "total_words": 0,
+        "words_per_minute": 0,
+        "top_10_words": [],
+        "magic_word_percentages": {},
+    }
+
+
+def timing_metrics(metrics: dict) -> dict:
+    """Extrai as métricas de tempo (VAD) de um bloco `metrics` existente."""
+    return {key: metrics[key] for key in TIMING_KEYS if key in metrics}
+
+
+def speech_intervals(segments: Iterable[dict]) -> List[tuple]:
+    """Intervalos de fala: as palavras (com `word_timestamps`) ou os segmentos inteiros."""
+    intervals = []
+    for segment in segments:
+        if segment.get("words"):
+            intervals.extend((word["start"], word["end"]) for word in segment["words"])
+        else:
+            intervals.append((segment["start"], segment["end"]))
+    return sorted(intervals)
+
+
+def speaker_turns(segments: Iterable[dict], max_gap: float = TURN_GAP_SECONDS) -> List[tuple]:
+    """Junta os intervalos de fala de um falante em turnos separados por pausas > `max_gap`."""
+    turns = []
+    for start, end in speech_intervals(segments):
+        if turns and start - turns[-1][1] <= max_gap:
+            turns[-1] = (turns[-1][0], max(turns[-1][1], end))
+        else:
+            turns.append((start, end))
+    return turns
+
+
+def count_interruptions(turns: List[tuple], other_turns: List[tuple]) -> int:
+    """Turnos que começam enquanto o outro falante ainda está com a palavra."""
+    interruptions = 0
+    j = 0
+    for start, _ in turns:
+        while j < len(other_turns) and other_turns[j][1] <= start:
+            j += 1
+        if j < len(other_turns) and other_turns[j][0] < start:
+            interruptions += 1
+    return interruptions
+
+
+def speaker_metrics(transcription: Iterable[dict], matcher: MagicWordMatcher) -> dict:
+    """Tempo de fala, WPM, palavras mágicas e interrupções de cada falante."""
+    by_speaker = {}
+    for segment in transcription:
+        if segment.get("speaker"):
+            by_speaker.setdefault(segment["speaker"], []).append(segment)
+    turns = {speaker: speaker_turns(segments) for speaker, segments in by_speaker.items()}
+
+    metrics = {}
+    for speaker, segments in by_speaker.items():
+        total_words = 0
+        magic_word_count = Counter()
+        for segment in segments:
+            total_words += len(segment["transcription"].split())
+            magic_word_count.update(matcher.count(segment["transcription"]))
+        talk_seconds = sum(end - start for start, end in speech_intervals(segments))
+        other_turns = sorted(
+            turn for other, other_turns in turns.items() if other != speaker for turn in other_turns
+        )
+        metrics[speaker] = {
+            "talk_seconds": talk_seconds,
+            "turns": len(turns[speaker]),
+            "total_words": total_words,
+            "words_per_minute": (total_words / talk_seconds) * 60 if talk_seconds > 0 else 0,
+            "magic_word_percentages": matcher.percentages(magic_word_count, total_words)
+            if total_words
+            else {},
+            "interruptions": count_interruptions(turns[speaker], other_turns),
+        }
+    return metrics
+
+
+def analyze_transcription(
+    transcription: Iterable[dict], matcher: MagicWordMatcher = None, timing: dict = None
+) -> dict:
+    """Calcula as métricas a partir dos segmentos de uma transcrição.
+
+    Cada segmento segue o formato salvo no JSON (`start`, `end` e
+    `transcription`), então a mesma análise serve tanto logo após a
+    decodificação quanto para reprocessar JSONs existentes sem o Whisper.
+    Com `timing` (tempo de fala medido pelo VAD), o WPM usa o tempo de fala
+    e as métricas de tempo são incluídas no resultado. Segmentos com `speaker`
+    (atendente/cliente) geram também métricas por falante em `speakers`.
+    """
+    transcription = list(transcription)
+    timing = timing or {}
+    matcher = matcher or load_matcher()
+    total_words = 0
+    word_count = Counter()
+    magic_word_count = Counter()
+    total_duration = 0
+
+    for segment in transcription:
+        words = segment["transcription"].lower().split()
+        total_words += len(words)
+        word_count.update(words)
+        total_duration += segment["end"] - segment["start"]
+        magic_word_count.update(matcher.count(segment["transcription"]))
+
+    if timing.get("speech_seconds"):
+        total_duration = timing["speech_seconds"]
+
+    metrics = empty_metrics()
+    metrics.update(timing)
+    if total_duration > 0 and total_words > 0:
+        metrics.update(
+            {
+                "total_words": total_words,
+                "words_per_minute": (total_words / total_duration) * 60,
+                "top_10_words": word_count.most_common(10),
+                "magic_word_percentages": matcher.percentages(magic_word_count, total_words),
+            }
+        )
+    speakers = speaker_metrics(transcription, matcher)
+    if speakers:
+        metrics["speakers"] = speakers
+    return metrics
@@ -0,0 +1,142 @@
+import logging
+import threading
+
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from faster_whisper import decode_audio
+
+from telemetry import telemetry
+from vad import SAMPLING_RATE, audio_channels
+
+
+# Extensões reconhecidas como áudio. A decodificação é do FFmpeg (PyAV), então
+# o codec dentro do contêiner não importa: WAV com µ-law/A-law ou GSM 6.10,
+# Ogg/Opus, FLAC, AMR etc. são lidos da mesma forma.
+AUDIO_EXTENSIONS = (
+    ".wav", ".mp3", ".m4a", ".mp4", ".aac", ".ogg", ".oga", ".opus", ".flac",
+    ".gsm", ".au", ".amr", ".wma", ".webm",
+)
+
+
+def is_audio_file(path: str) -> bool:
+    return str(path).lower().endswith(AUDIO_EXTENSIONS)
+
+
+def find_audio_files(audio_path: str) -> List[str]:
+    """Áudios de um diretório (ou o próprio arquivo), em ordem de nome.
+
+    A extensão é comparada sem diferenciar maiúsculas (`.WAV`, `.Mp3`).
+    """
+    audio_path = Path(audio_path)
+    if audio_path.is_file():
+        return [str(audio_path)]
+    return sorted(
+        str(path) for path in audio_path.iterdir() if path.is_file() and is_audio_file(path.name)
+    )
+
+
+class DecodedAudio:
+    """Áudio já decodificado e reamostrado a 16 kHz, pronto para o `model.transcribe`.
+
+    `mono` é a mixagem em um canal e `stereo` os canais esquerdo e direito
+    (apenas em gravações com dois ou mais canais, quando pedidos).
+    """
+
+    def __init__(self, audio_path: str, channels: int, mono=None, stereo: tuple = None):
+        self.audio_path = audio_path
+        self.channels = channels
+        self.mono = mono
+        self.stereo = stereo
+
+
+def decode(audio_path: str, split_stereo: bool = False, stereo: bool = False) -> DecodedAudio:
+    """Decodifica um arquivo para 16 kHz.
+
+    Com `split_stereo`, gravações estéreo são entregues só por canal (cada lado
+    é transcrito separadamente); com `stereo`, os canais são decodificados além
+    da mixagem mono (para medir a fala simultânea com VAD).
+    """
+    channels = audio_channels(audio_path)
+    mono = left_right = None
+    if channels >= 2 and (split_stereo or stereo):
+        left_right = decode_audio(str(audio_path), sampling_rate=SAMPLING_RATE, split_stereo=True)
+        if not split_stereo:
+            # Mesma mixagem do FFmpeg, sem decodificar o arquivo uma segunda vez.
+            mono = (left_right[0] + left_right[1]) / 2
+    else:
+        mono = decode_audio(str(audio_path), sampling_rate=SAMPLING_RATE)
+    return DecodedAudio(str(audio_path), channels, mono, left_right)
+
+
+class AudioDecoder:
+    """Decodifica áudios em um pool de threads à frente do modelo.
+
+    A decodificação e a reamostragem do PyAV rodam em C sem o GIL, então
+    acontecem enquanto o CTranslate2 transcreve o arquivo anterior. Os
+    arquivos passam por `decode_ahead` (que dispara a decodificação) e o
+    resultado é retirado com `take` na hora de transcrever.
+    """
+
+    def __init__(self, workers: int = 2, split_stereo: bool = False, stereo: bool = False):
+        """Inicializa o decodificador.
+
+        Args:
+            workers (int): Threads de decodificação.
+            split_stereo (bool): Entrega gravações estéreo só por canal (`--speakers`).
+            stereo (bool): Decodifica também os canais de gravações estéreo (`--vad`).
+        """
+        self.split_stereo = split_stereo
+        self.stereo = stereo
+        self._executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="decode")
+        self._futures: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    def _decode(self, audio_path: str) -> DecodedAudio:
+        with telemetry.stage("audio_decode", audio_path=audio_path):
+            return decode(audio_path, self.split_stereo, self.stereo)
+
+    def submit(self, audio_path: str) -> None:
+        with self._lock:
+            self._futures[str(audio_path)] = self._executor.submit(self._decode, str(audio_path))
+
+    def decode_ahead(self, audio_files: Iterable[str], ahead: int = 2) -> Iterator[str]:
+        """Repassa os arquivos mantendo `ahead` deles já em decodificação.
+
+        Com `ahead` = 0 cada arquivo começa a ser decodificado quando é
+        repassado, o que basta quando quem consome já tem uma fila (como o
+        `StreamingPipeline`). A memória fica limitada aos arquivos em espera.
+        """
+        window = deque()
+        for audio_file in audio_files:
+            self.submit(audio_file)
+            window.append(audio_file)
+            if len(window) > ahead:
+                yield window.popleft()
+        while window:
+            yield window.popleft()
+
+    def take(self, audio_path: str) -> Optional[DecodedAudio]:
+        """Aguarda e retira o áudio decodificado (None se não foi enviado ou falhou).
+
+        Em caso de falha o arquivo segue pelo caminho, e o erro aparece na
+        transcrição como antes.
+        """
+        with self._lock:
+            future = self._futures.pop(str(audio_path), None)
+        if future is None:
+            return None
+        try:
+            return future.result()
+        except Exception as e:
+            logging.warning(f"Falha ao decodificar {audio_path} antecipadamente: {e}")
+            return None
+
+    def close(self) -> None:
+        with self._lock:
+            for future in self._futures.values():
+                future.cancel()
+            self._futures.clear()
+        self._executor.shutdown(wait=True)
@@ -1,32 +1,327 @@
 # azure_blob_downloader.py
 
-from azure.storage.blob import BlobServiceClient
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from pathlib import Path
+import json
+import logging
 import os
+import threading
 
-def download_blobs(connection_string: str, container_name: str, download_path: str):
+from claims import claimed, reclaim
+from telemetry import telemetry
+
+MANIFEST_FILENAME = ".blob_manifest.json"
+# Downloads entre gravações do manifesto; um processo interrompido perde no
+# máximo esses registros (e baixa esses arquivos de novo).
+MANIFEST_SAVE_EVERY = 10
+
+
+def load_manifest(download_path: str) -> dict:
     """
-    Baixa blobs de um contêiner do Azure Blob Storage para um diretório local,
-    evitando downloads repetidos verificando a pasta.
+    Lê o manifesto local com a versão (ETag/MD5) de cada blob já baixado.
+
+    Args:
+        download_path (str): O diretório local dos downloads.
+
+    Returns:
+        dict: Entradas do manifesto indexadas pelo nome do blob.
+    """
+    manifest_file = os.path.join(download_path, MANIFEST_FILENAME)
+    try:
+        with open(manifest_file, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_manifest(download_path: str, manifest: dict) -> None:
+    """
+    Grava o manifesto de forma atômica (arquivo temporário + rename).
+
+    Args:
+        download_path (str): O diretório local dos downloads.
+        manifest (dict): Entradas do manifesto indexadas pelo nome do blob.
+    """
+    manifest_file = os.path.join(download_path, MANIFEST_FILENAME)
+    tmp_file = manifest_file + ".tmp"
+    with open(tmp_file, "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+    os.replace(tmp_file, manifest_file)
+
+
+class BlobManifest:
+    """
+    Manifesto de downloads em memória, compartilhado entre as threads de
+    download e gravado em disco a cada `save_every` alterações.
+    """
+
+    def __init__(self, download_path: str, save_every: int = MANIFEST_SAVE_EVERY):
+        """
+        Args:
+            download_path (str): O diretório local dos downloads.
+            save_every (int): Alterações entre gravações do manifesto.
+        """
+        self.download_path = download_path
+        self.save_every = max(1, save_every)
+        self.entries = load_manifest(download_path)
+        self._lock = threading.Lock()
+        self._unsaved = 0
+
+    def get(self, blob_name: str) -> dict:
+        with self._lock:
+            return self.entries.get(blob_name)
+
+    def set(self, blob_name: str, entry: dict) -> None:
+        """Substitui a entrada de um blob (por exemplo, após baixar uma nova versão)."""
+        with self._lock:
+            self.entries[blob_name] = entry
+            self._changed()
+
+    def update(self, blob_name: str, **fields) -> None:
+        """Altera campos da entrada de um blob."""
+        with self._lock:
+            entry = self.entries.setdefault(blob_name, {})
+            if any(entry.get(key) != value for key, value in fields.items()):
+                entry.update(fields)
+                self._changed()
+
+    def _changed(self) -> None:
+        self._unsaved += 1
+        if self._unsaved >= self.save_every:
+            self._save()
+
+    def discard(self, local_path: str) -> None:
+        """Marca o blob de um áudio apagado após o processamento (`--delete_audio`)."""
+        blob_name = Path(os.path.relpath(local_path, self.download_path)).as_posix()
+        with self._lock:
+            if blob_name in self.entries:
+                self.entries[blob_name]["discarded"] = True
+                self._changed()
+
+    def save(self) -> None:
+        with self._lock:
+            self._save()
+
+    def _save(self) -> None:
+        save_manifest(self.download_path, self.entries)
+        self._unsaved = 0
+
+
+def _content_md5(blob) -> str:
+    md5 = blob.content_settings.content_md5 if blob.content_settings else None
+    return bytes(md5).hex() if md5 else None
+
+
+def _priority(blob) -> str:
+    """Tag de prioridade do blob (metadado `priority`), usada pelo agendador."""
+    return (blob.metadata or {}).get("priority")
+
+
+def is_current(blob, entry: dict, local_path: str) -> bool:
+    """
+    Verifica se o arquivo local corresponde à versão atual do blob.
+
+    O arquivo é considerado atual quando o manifesto registra o mesmo ETag
+    (ou o mesmo MD5 de conteúdo) e o tamanho local é igual ao do blob, o que
+    também detecta downloads truncados.
+
+    Args:
+        blob (BlobProperties): As propriedades do blob listado.
+        entry (dict): A entrada do manifesto para o blob, se houver.
+        local_path (str): O caminho local do arquivo.
+    """
+    if not entry or not os.path.exists(local_path):
+        return False
+    if os.path.getsize(local_path) != blob.size:
+        return False
+    md5 = _content_md5(blob)
+    return entry.get("etag") == blob.etag or (md5 is not None and entry.get("content_md5") == md5)
+
+
+def is_discarded(blob, entry: dict) -> bool:
+    """
+    Verifica se o blob já foi processado e teve o áudio local apagado
+    (`--delete_audio`) sem que a versão no contêiner tenha mudado.
+
+    Args:
+        blob (BlobProperties): As propriedades do blob listado.
+        entry (dict): A entrada do manifesto para o blob, se houver.
+    """
+    if not entry or not entry.get("discarded") or entry.get("size") != blob.size:
+        return False
+    md5 = _content_md5(blob)
+    return entry.get("etag") == blob.etag or (md5 is not None and entry.get("content_md5") == md5)
+
+
+def download_blob_to_file(container_client, blob, local_path: str, max_concurrency: int = 2) -> dict:
+    """
+    Baixa um blob direto para o disco, em blocos paralelos, sem carregá-lo
+    inteiro na memória.
+
+    O conteúdo é gravado em um arquivo `.part` e renomeado somente após o
+    tamanho ser conferido, então um download interrompido nunca parece completo.
+
+    Args:
+        container_client (ContainerClient): O cliente do contêiner de origem.
+        blob (BlobProperties): As propriedades do blob listado.
+        local_path (str): O caminho local de destino.
+        max_concurrency (int): Conexões paralelas para os blocos deste blob.
+
+    Returns:
+        dict: A entrada do manifesto para o blob baixado.
+    """
+    os.makedirs(os.path.dirname(local_path) or ".", exist_ok=True)
+    part_path = local_path + ".part"
+    downloader = container_client.download_blob(blob.name, max_concurrency=max_concurrency)
+    with open(part_path, "wb") as download_file:
+        size = downloader.readinto(download_file)
+    if size != blob.size:
+        os.remove(part_path)
+        raise IOError(f"Download truncado de {blob.name}: {size} de {blob.size} bytes")
+    os.replace(part_path, local_path)
+    return {
+        "etag": blob.etag,
+        "content_md5": _content_md5(blob),
+        "size": blob.size,
+        "priority": _priority(blob),
+    }
+
+
+def iter_blobs(
+    connection_string: str,
+    container_name: str,
+    download_path: str,
+    concurrency: int = 4,
+    max_concurrency: int = 2,
+    claims=None,
+    shard: tuple = None,
+    manifest: BlobManifest = None,
+):
+    """
+    Baixa os blobs de um contêiner em paralelo, entregando o caminho local de
+    cada arquivo assim que ele fica disponível.
+
+    Blobs cuja versão no manifesto local coincide com a do contêiner não são
+    baixados novamente. O manifesto é gravado a cada `MANIFEST_SAVE_EVERY`
+    downloads, então um processo interrompido não perde os já concluídos. No
+    máximo `concurrency` downloads ficam em andamento, então um consumidor
+    lento (por exemplo, o `--pipeline`) segura os downloads.
+
+    Com vários nós sobre o mesmo contêiner, cada nó baixa apenas os blobs do seu
+    `shard` e que conseguir reivindicar em `claims` (ver `claims.py`). A
+    reivindicação é feita na hora do download, então um nó só segura os blobs
+    que está prestes a processar; os que estavam com outro nó são tentados de
+    novo ao fim da listagem, até serem concluídos ou ficarem livres.
+
+    Quem consome os arquivos pode passar o próprio `manifest` e marcar nele
+    (com `BlobManifest.discard`) os áudios apagados após o processamento;
+    esses blobs não são baixados de novo enquanto não mudarem no contêiner.
 
     Args:
         connection_string (str): A string de conexão do Azure Blob Storage.
         container_name (str): O nome do contêiner de origem.
         download_path (str): O caminho local para onde os blobs serão baixados.
+        concurrency (int): Número de blobs baixados ao mesmo tempo.
+        max_concurrency (int): Conexões paralelas por blob.
+        claims (FileClaims | BlobLeaseClaims): Reivindicações por nome de blob.
+        shard (tuple): (índice, total) do shard deste nó.
+        manifest (BlobManifest): O manifesto de `download_path` (criado se omitido).
+
+    Yields:
+        Path: O caminho local do blob baixado (ou já atualizado na pasta).
     """
+    from azure.storage.blob import BlobServiceClient
+
     os.makedirs(download_path, exist_ok=True)
 
     blob_service_client = BlobServiceClient.from_connection_string(connection_string)
     container_client = blob_service_client.get_container_client(container_name)
 
-    blobs_list = container_client.list_blobs()
-
-    for blob in blobs_list:
-        download_file_path = os.path.join(download_path, blob.name)
-        if os.path.exists(download_file_path):
-          continue
-        print(f"Baixando blob para: {download_file_path}")
-        with open(download_file_path, "wb") as download_file:
-            download_file.write(container_client.download_blob(blob.name).readall())
-    print("Download dos arquivos concluído!")        
-    return Path(download_path)  
\ No newline at end of file
+    if manifest is None:
+        manifest = BlobManifest(download_path)
+
+    def fetch(blob, local_path):
+        print(f"Baixando blob para: {local_path}")
+        try:
+            with telemetry.stage("download", blob=blob.name):
+                entry = download_blob_to_file(container_client, blob, local_path, max_concurrency)
+            telemetry.inc("recogni_download_bytes_total", blob.size or 0)
+        except Exception as e:
+            logging.error(f"Erro ao baixar o blob {blob.name}: {e}")
+            if claims is not None:
+                claims.release(blob.name)
+            return None
+        manifest.set(blob.name, entry)
+        return Path(local_path)
+
+    pending = set()
+
+    def download(blobs, executor):
+        nonlocal pending
+        for blob in blobs:
+            download_file_path = os.path.join(download_path, blob.name)
+            if is_current(blob, manifest.get(blob.name), download_file_path):
+                manifest.update(blob.name, priority=_priority(blob))
+                yield Path(download_file_path)
+                continue
+
+            pending.add(executor.submit(fetch, blob, download_file_path))
+            if len(pending) >= concurrency:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    if future.result():
+                        yield future.result()
+
+        for future in list(pending):
+            if future.result():
+                yield future.result()
+        pending = set()
+
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+            listed = (
+                blob
+                for blob in container_client.list_blobs(include=["metadata"])
+                if not is_discarded(blob, manifest.get(blob.name))
+            )
+            # Os blobs com outro nó são tentados de novo só depois que os
+            # downloads da primeira passada foram entregues.
+            skipped = {}
+            yield from download(
+                claimed(listed, claims, shard, lambda blob: blob.name, skipped=skipped), executor
+            )
+            if claims is not None:
+                yield from download(reclaim(skipped, claims), executor)
+    finally:
+        for future in pending:
+            future.cancel()
+        manifest.save()
+
+
+def download_blobs(
+    connection_string: str,
+    container_name: str,
+    download_path: str,
+    concurrency: int = 4,
+    max_concurrency: int = 2,
+    shard: tuple = None,
+):
+    """
+    Baixa blobs de um contêiner do Azure Blob Storage para um diretório local,
+    evitando downloads repetidos com base no manifesto de ETag/MD5.
+
+    Args:
+        connection_string (str): A string de conexão do Azure Blob Storage.
+        container_name (str): O nome do contêiner de origem.
+        download_path (str): O caminho local para onde os blobs serão baixados.
+        concurrency (int): Número de blobs baixados ao mesmo tempo.
+        max_concurrency (int): Conexões paralelas por blob.
+        shard (tuple): (índice, total) do shard deste nó; baixa apenas os seus blobs.
+    """
+    for _ in iter_blobs(
+        connection_string, container_name, download_path, concurrency, max_concurrency,
+        shard=shard,
+    ):
+        pass
+    print("Download dos arquivos concluído!")
+    return Path(download_path)
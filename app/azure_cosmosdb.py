@@ -1,14 +1,28 @@
 import os
-import json
+import hashlib
 import logging
-import uuid
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from azure.cosmos import CosmosClient, exceptions
+from telemetry import telemetry
+from transcript_io import is_transcript, load_transcript
 
 class CosmosDBUploader:
     """A class for uploading JSON files to CosmosDB."""
 
-    def __init__(self, cosmos_endpoint, cosmos_key, database_name, container_name):
+    def __init__(
+        self,
+        cosmos_endpoint,
+        cosmos_key,
+        database_name,
+        container_name,
+        model_name=None,
+        max_workers=8,
+        max_retries=8,
+    ):
         """Initializes the CosmosDBUploader object.
 
         Args:
@@ -16,48 +30,158 @@ class CosmosDBUploader:
             cosmos_key (str): The CosmosDB key.
             database_name (str): The name of the database.
             container_name (str): The name of the container.
+            model_name (str, optional): The Whisper model used for the transcriptions,
+                part of the deterministic document id (default: None).
+            max_workers (int, optional): Maximum concurrent upserts (default: 8).
+            max_retries (int, optional): Retries for throttled (429) requests (default: 8).
         """
         self.client = CosmosClient(url=cosmos_endpoint, credential=cosmos_key)
         self.database = self.client.get_database_client(database_name)
         self.container = self.database.get_container_client(container_name)
         self.date = datetime.today().isoformat()
+        self.model_name = model_name
+        self.max_workers = max(1, max_workers)
+        self.max_retries = max_retries
+
+        self._lock = threading.Lock()
+        self._throttle_delay = 0.0
+        self.request_charge = 0.0
+        self.documents = 0
+        self.failures = []
 
     def upload_files(self, paths):
         """Uploads JSON files to CosmosDB, based on a list of paths.
 
+        Files are upserted concurrently on a bounded thread pool.
+
         Args:
             paths (list): A list of paths to files or directories.
+
+        Returns:
+            dict: Documents written, failed files, RU consumed and docs/sec.
         """
+        files = []
         for path in paths:
             if os.path.isfile(path):
-                self.upload_file(path)
+                files.append(path)
             elif os.path.isdir(path):
                 for filename in os.listdir(path):
-                    file_path = os.path.join(path, filename)
-                    if filename.endswith('.json'):
-                        self.upload_file(file_path)
+                    if is_transcript(filename):
+                        files.append(os.path.join(path, filename))
             else:
                 logging.error(f"Invalid path: {path}")
 
+        start = time.perf_counter()
+        documents, charge = self.documents, self.request_charge
+        failures = len(self.failures)
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            list(executor.map(self.upload_file, files))
+        elapsed = time.perf_counter() - start
+
+        written = self.documents - documents
+        report = {
+            "documents": written,
+            "failed": self.failures[failures:],
+            "request_charge": self.request_charge - charge,
+            "docs_per_sec": written / elapsed if elapsed > 0 else 0.0,
+        }
+        logging.info(
+            f"Cosmos bulk upload: {written} documents, {len(report['failed'])} failed, "
+            f"{report['request_charge']:.2f} RU, {report['docs_per_sec']:.2f} docs/s"
+        )
+        return report
+
     def upload_file(self, file_path):
-        """Uploads a single JSON file to CosmosDB.
+        """Uploads a single transcription file (any transcript_io format) to CosmosDB.
 
         Args:
-            file_path (str): The path to the JSON file.
+            file_path (str): The path to the transcription file.
+
+        Returns:
+            bool: True if the document was written, False otherwise.
         """
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
+            data = load_transcript(file_path)
+        except Exception as e:
+            logging.error(f"Error processing file {file_path}: {e}")
+            with self._lock:
+                self.failures.append(file_path)
+            return False
+        return self.upload_data(data, file_path)
+
+    def upload_data(self, data, file_path):
+        """Uploads a transcription result already in memory to CosmosDB.
+
+        Avoids reading back the file that was just written.
+
+        Args:
+            data (dict): The transcription result.
+            file_path (str): The path where the result was saved.
 
-            if 'transcription' in data:
-                self.insert_transcription(data, file_path)
+        Returns:
+            bool: True if the document was written, False otherwise.
+        """
+        if 'transcription' not in data:
+            return False
+        try:
+            if self.insert_transcription(data, file_path):
+                return True
         except Exception as e:
             logging.error(f"Error processing file {file_path}: {e}")
+        with self._lock:
+            self.failures.append(file_path)
+        return False
+
+    def document_id(self, data):
+        """Builds a deterministic document id from audio path, model and prompt.
+
+        Reprocessing the same audio with the same settings yields the same id,
+        so upserts replace the previous document instead of duplicating it.
+        """
+        key = "\x1f".join([data['audio_path'], self.model_name or "", data.get('prompt') or ""])
+        return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+    def _on_response(self, headers, _):
+        charge = headers.get('x-ms-request-charge')
+        if charge:
+            with self._lock:
+                self.request_charge += float(charge)
+            telemetry.inc("recogni_cosmos_request_charge_total", float(charge))
+
+    def _upsert_with_backoff(self, item):
+        """Upserts an item, backing off adaptively while CosmosDB throttles (429).
+
+        The shared delay paces only the first attempt; retries wait just the
+        `x-ms-retry-after-ms` the server asked for.
+        """
+        for attempt in range(self.max_retries + 1):
+            if attempt == 0 and self._throttle_delay:
+                time.sleep(self._throttle_delay * random.uniform(0.5, 1.0))
+            try:
+                self.container.upsert_item(body=item, response_hook=self._on_response)
+                with self._lock:
+                    self._throttle_delay = self._throttle_delay / 2 if self._throttle_delay > 0.05 else 0.0
+                return
+            except exceptions.CosmosHttpResponseError as e:
+                if e.status_code != 429 or attempt == self.max_retries:
+                    raise
+                retry_after_ms = (e.headers or {}).get('x-ms-retry-after-ms')
+                retry_after = float(retry_after_ms) / 1000 if retry_after_ms else 0.1
+                telemetry.inc("recogni_cosmos_throttled_total")
+                with self._lock:
+                    self._throttle_delay = min(max(retry_after, self._throttle_delay * 2), 30.0)
+                logging.warning(f"Throttled by CosmosDB, retrying {item['id']} in {retry_after:.2f}s")
+                time.sleep(retry_after)
 
     def insert_transcription(self, data, filename):
-        """Inserts transcription data into the CosmosDB container."""
+        """Inserts transcription data into the CosmosDB container.
+
+        Returns:
+            bool: True if the document was written, False otherwise.
+        """
+        id = None
         try:
-            id = str(uuid.uuid4())
+            id = self.document_id(data)
             transcricao_item = {
                 'id': id,
                 'prompt': data['prompt'],
@@ -66,7 +190,12 @@ class CosmosDBUploader:
                 'transcription': data['transcription'],
                 'execution_date': self.date
             }
-            self.container.create_item(body=transcricao_item)
+            with telemetry.stage("cosmos_insert", document_id=id):
+                self._upsert_with_backoff(transcricao_item)
+            with self._lock:
+                self.documents += 1
             logging.info(f"Transcriptions inserted successfully for {id}")
+            return True
         except exceptions.CosmosHttpResponseError as e:
-            logging.error(f"Error inserting transcriptions for {id}: {e}")
\ No newline at end of file
+            logging.error(f"Error inserting transcriptions for {id}: {e}")
+            return False
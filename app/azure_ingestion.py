@@ -45,17 +45,18 @@ class AzureBlobStorageUploader:
                 print(f"{filename} não é um arquivo {file_type} ou é um diretório.")
 
 
-# Example usage
-storage_account_key = os.environ['STORAGE_ACCOUNT_KEY']
-container_audio = os.environ['CONTAINER_AUDIOS']
-container_json = os.environ['CONTAINER_JSON']
-container_logs = os.environ['CONTAINER_LOGS']
+if __name__ == "__main__":
+    # Example usage
+    storage_account_key = os.environ['STORAGE_ACCOUNT_KEY']
+    container_audio = os.environ['CONTAINER_AUDIOS']
+    container_json = os.environ['CONTAINER_JSON']
+    container_logs = os.environ['CONTAINER_LOGS']
 
-uploader = AzureBlobStorageUploader(storage_account_key, container_audio)
-uploader.upload_files('.wav', './audio_samples/audio_samples')
+    uploader = AzureBlobStorageUploader(storage_account_key, container_audio)
+    uploader.upload_files('.wav', './audio_samples/audio_samples')
 
-uploader.container_name = container_json
-uploader.upload_files('.json', './json_files')
+    uploader.container_name = container_json
+    uploader.upload_files('.json', './json_files')
 
-uploader.container_name = container_logs
-uploader.upload_files('.log', './logs')
\ No newline at end of file
+    uploader.container_name = container_logs
+    uploader.upload_files('.log', './logs')
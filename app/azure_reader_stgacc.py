@@ -15,6 +15,20 @@ class AzureBlobReader:
         """
         self.blob_service_client = BlobServiceClient.from_connection_string(connection_string)
 
+    def list_blob_names(self, container_name, name_starts_with=None):
+        """
+        Lists the names of the blobs in a container, lazily and page by page.
+
+        Args:
+            container_name (str): The name of the container.
+            name_starts_with (str, optional): Only list blobs with this prefix (default: None).
+
+        Returns:
+            Iterator[str]: The blob names.
+        """
+        container_client = self.blob_service_client.get_container_client(container_name)
+        return (blob.name for blob in container_client.list_blobs(name_starts_with=name_starts_with))
+
     def download_file(self, container_name, blob_name, local_path):
         """
         Downloads a blob from Azure Blob Storage to a local file.
@@ -39,8 +53,21 @@ class AzureBlobReader:
         Returns:
             str: The content of the blob.
         """
+        return self.read_blob_bytes(container_name, blob_name).decode('utf-8')
+
+    def read_blob_bytes(self, container_name, blob_name):
+        """
+        Reads the raw content of a blob (e.g. a compressed transcription).
+
+        Args:
+            container_name (str): The name of the container.
+            blob_name (str): The name of the blob.
+
+        Returns:
+            bytes: The content of the blob.
+        """
         blob_client = self.blob_service_client.get_blob_client(container=container_name, blob=blob_name)
-        return blob_client.download_blob().readall().decode('utf-8')
+        return blob_client.download_blob().readall()
 
     def download_file_to_specific_folder(self, container_name, blob_name, local_folder_path):
         """
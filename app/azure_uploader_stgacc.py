@@ -1,14 +1,65 @@
+import hashlib
 import logging
-from azure.storage.blob import BlobServiceClient, BlobClient, ContainerClient
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from azure.core.exceptions import ResourceNotFoundError
+from azure.storage.blob import BlobServiceClient, BlobClient, ContainerClient, ContentSettings
 from dotenv import load_dotenv
+from telemetry import telemetry
 import os
 
+# Block size used when staging large files; blocks are uploaded in parallel.
+MAX_BLOCK_SIZE = 4 * 1024 * 1024
+MAX_SINGLE_PUT_SIZE = 8 * 1024 * 1024
+
+_service_clients = {}
+_service_clients_lock = threading.Lock()
+
+
+def get_blob_service_client(connection_string):
+    """
+    Returns a BlobServiceClient shared by every uploader using the same
+    connection string, so containers reuse one connection pool.
+
+    Args:
+        connection_string (str): The storage account connection string.
+    """
+    with _service_clients_lock:
+        client = _service_clients.get(connection_string)
+        if client is None:
+            client = BlobServiceClient.from_connection_string(
+                connection_string,
+                max_block_size=MAX_BLOCK_SIZE,
+                max_single_put_size=MAX_SINGLE_PUT_SIZE,
+            )
+            _service_clients[connection_string] = client
+        return client
+
+
+def file_md5(file_path, chunk_size=1024 * 1024):
+    """
+    Computes the MD5 digest of a local file without loading it into memory.
+
+    Args:
+        file_path (str): The path to the file.
+
+    Returns:
+        bytes: The MD5 digest.
+    """
+    md5 = hashlib.md5()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            md5.update(chunk)
+    return md5.digest()
+
+
 class AzureBlobUploader:
     """
     A class for uploading files to Azure Blob Storage with logging capabilities.
     """
 
-    def __init__(self, storage_account_key, container_name, log_level=logging.INFO, log_file=None):
+    def __init__(self, storage_account_key, container_name, log_level=logging.INFO, log_file=None,
+                 max_workers=8, max_concurrency=4):
         """
         Initializes the class with the storage account key, container name,
         optional log level, and log file path.
@@ -18,13 +69,17 @@ class AzureBlobUploader:
             container_name (str): The name of the Azure Blob Storage container.
             log_level (int, optional): The logging level (default: logging.INFO).
             log_file (str, optional): The file path for log messages (default: None).
+            max_workers (int, optional): Files uploaded at the same time (default: 8).
+            max_concurrency (int, optional): Parallel block uploads per file (default: 4).
         """
 
         load_dotenv()
         self.storage_account_key = storage_account_key
         self.container_name = container_name
-        self.blob_service_client = BlobServiceClient.from_connection_string(self.storage_account_key)
+        self.blob_service_client = get_blob_service_client(self.storage_account_key)
         self.container_client = self.blob_service_client.get_container_client(self.container_name)
+        self.max_workers = max(1, max_workers)
+        self.max_concurrency = max(1, max_concurrency)
 
         # Configure logging
         self.logger = logging.getLogger(__name__)
@@ -35,37 +90,67 @@ class AzureBlobUploader:
         else:
             logging.basicConfig(level=log_level)  # Log to console by default
 
-    def upload_file(self, file_path, overwrite=False):
+    def remote_md5(self, blob_client):
+        """
+        Returns the content MD5 of an existing blob.
+
+        Args:
+            blob_client (BlobClient): The client of the blob.
+
+        Returns:
+            bytes: The MD5 digest (empty if the blob has none), or None if the blob doesn't exist.
+        """
+        try:
+            properties = blob_client.get_blob_properties()
+        except ResourceNotFoundError:
+            return None
+        md5 = properties.content_settings.content_md5
+        return bytes(md5) if md5 else b""
+
+    def upload_file(self, file_path, overwrite=False, blob_name=None):
         """
         Uploads a single file to the Azure Blob Storage container, handling existing blobs.
 
+        Blobs whose content MD5 matches the local file are left untouched. Large
+        files are staged as blocks uploaded in parallel.
+
         Args:
             file_path (str): The path to the file to be uploaded.
             overwrite (bool, optional): Whether to overwrite an existing blob (default: False).
+            blob_name (str, optional): The target blob name, including any virtual
+                directories (default: the file's basename).
 
         Returns:
-            bool: True if upload is successful, False otherwise.
+            bool: True if the blob holds the file's content (uploaded or unchanged), False otherwise.
         """
 
-        filename = os.path.basename(file_path)
+        filename = blob_name or os.path.basename(file_path)
         blob_client = self.container_client.get_blob_client(filename)
 
         try:
-            if not overwrite:
-                self.logger.warning(f"Blob {filename} already exists. Skipping upload.")
-                return False
-
-            # If overwrite is True, delete the existing blob
-            blob_client.delete_blob()
-            self.logger.info(f"Overwriting existing blob {filename}")
-
-        except Exception:
-            # Blob doesn't exist, proceed with upload
-            pass
-
-        try:
-            with open(file_path, "rb") as data:
-                blob_client.upload_blob(data)
+            local_md5 = file_md5(file_path)
+            existing_md5 = self.remote_md5(blob_client)
+
+            if existing_md5 == local_md5:
+                self.logger.info(f"Blob {filename} is up to date. Skipping upload.")
+                telemetry.inc("recogni_blob_skipped_total", container=self.container_client.container_name)
+                return True
+
+            if existing_md5 is not None:
+                if not overwrite:
+                    self.logger.warning(f"Blob {filename} already exists. Skipping upload.")
+                    return False
+                self.logger.info(f"Overwriting existing blob {filename}")
+
+            with telemetry.stage("blob_upload", container=self.container_client.container_name):
+                with open(file_path, "rb") as data:
+                    blob_client.upload_blob(
+                        data,
+                        overwrite=True,
+                        max_concurrency=self.max_concurrency,
+                        content_settings=ContentSettings(content_md5=bytearray(local_md5)),
+                    )
+            telemetry.inc("recogni_blob_upload_bytes_total", os.path.getsize(file_path))
 
             self.logger.info(f"Upload do arquivo {filename} concluído!")
             return True
@@ -74,14 +159,27 @@ class AzureBlobUploader:
             self.logger.error(f"Erro ao fazer upload do arquivo {filename}: {e}")
             return False
 
-    def upload_files(self, file_paths, overwrite=False):
+    def upload_files(self, file_paths, overwrite=False, blob_names=None):
         """
         Uploads files from a list of paths to the Azure Blob Storage container, handling existing blobs.
 
+        Files are uploaded in parallel.
+
         Args:
             file_paths (list): A list of file paths to be uploaded.
             overwrite (bool, optional): Whether to overwrite existing blobs (default: False).
+            blob_names (dict, optional): Target blob name for each file path
+                (default: each file's basename).
+
+        Returns:
+            dict: The result of upload_file for each file path.
         """
 
-        for file_path in file_paths:
-            self.upload_file(file_path, overwrite=overwrite)
\ No newline at end of file
+        file_paths = list(file_paths)
+        blob_names = blob_names or {}
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            results = executor.map(
+                lambda path: self.upload_file(path, overwrite=overwrite, blob_name=blob_names.get(path)),
+                file_paths,
+            )
+            return dict(zip(file_paths, results))
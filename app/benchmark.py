@@ -0,0 +1,428 @@
+import argparse
+import itertools
+import multiprocessing
+import os
+import platform
+import random
+import re
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import ujson
+import wave
+
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from faster_whisper import BatchedInferencePipeline, decode_audio
+
+from audio_io import find_audio_files
+from magic_words import DEFAULT_LEXICON, load_matcher
+from reanalyze import iter_json_files
+import recogni
+from recogni import channel_workers, load_model, process_file_result, transcribe_and_analyze
+from telemetry import telemetry
+from transcript_io import FORMATS, load_transcript
+from vad import vad_parameters as build_vad_parameters
+
+
+SAMPLING_RATE = 16000
+
+# Implementação anterior (uma regex por raiz), mantida como referência.
+LEGACY_MAGIC_WORD_ROOTS = [
+    "obrigado", "por favor", "desculpa", "boa", "agradeço",
+    "gratidão", "sinto muito", "perdão", "com licença",
+]
+LEGACY_MAGIC_WORD_PATTERNS = {
+    root: re.compile(rf"\b{root}(a|o|as|os)?s?\b") for root in LEGACY_MAGIC_WORD_ROOTS
+}
+
+FILLER_WORDS = (
+    "então o sistema da totvs não está emitindo a nota fiscal do cliente "
+    "vou verificar aqui um momento por gentileza o senhor pode confirmar o cnpj"
+).split()
+MAGIC_PHRASES = [
+    "obrigado", "muito obrigada", "por favor", "desculpe", "bom dia", "boa tarde",
+    "agradeço", "sinto muito", "me perdoe", "com licença", "por gentileza",
+]
+
+
+def audio_duration(audio_file: str) -> float:
+    """Retorna a duração do áudio em segundos, decodificado a 16 kHz."""
+    return len(decode_audio(str(audio_file), sampling_rate=SAMPLING_RATE)) / SAMPLING_RATE
+
+
+def run_mode(model, audio_files: list, prompt: str, beam_size: int, batch_size: int) -> dict:
+    """Transcreve o conjunto de amostras e mede o fator de tempo real (RTF)."""
+    files = []
+    for audio_file in audio_files:
+        start = time.perf_counter()
+        filename, _ = transcribe_and_analyze(audio_file, prompt, model, beam_size, batch_size)
+        elapsed = time.perf_counter() - start
+        files.append({"audio_path": str(audio_file), "seconds": elapsed, "ok": bool(filename)})
+
+    total_seconds = sum(item["seconds"] for item in files)
+    return {"files": files, "total_seconds": total_seconds}
+
+
+def compare_batched(args) -> dict:
+    """Compara o caminho sequencial com o BatchedInferencePipeline."""
+    audio_files = find_audio_files(args.audio_path)
+    if not audio_files:
+        raise ValueError(f"Nenhum arquivo de áudio encontrado em {args.audio_path}")
+    total_audio = sum(audio_duration(audio_file) for audio_file in audio_files)
+
+    model = load_model(args.model_size, args.device, args.compute_type, args.cpu_threads)
+    modes = {
+        "sequential": (model, 0),
+        "batched": (BatchedInferencePipeline(model=model), args.batch_size),
+    }
+
+    report = {
+        "model_size": args.model_size,
+        "device": args.device,
+        "compute_type": args.compute_type,
+        "beam_size": args.beam_size,
+        "batch_size": args.batch_size,
+        "audio_files": len(audio_files),
+        "audio_seconds": total_audio,
+        "modes": {},
+    }
+    for name, (runner, batch_size) in modes.items():
+        result = run_mode(runner, audio_files, args.prompt, args.beam_size, batch_size)
+        result["rtf"] = result["total_seconds"] / total_audio
+        report["modes"][name] = result
+
+    report["speedup"] = (
+        report["modes"]["sequential"]["total_seconds"]
+        / report["modes"]["batched"]["total_seconds"]
+    )
+    return report
+
+
+def load_corpus(corpus_path: str, segments: int, seed: int = 0) -> list:
+    """Carrega os textos dos segmentos dos JSONs em `corpus_path`, ou gera um
+    corpus sintético reprodutível com `segments` segmentos."""
+    if corpus_path:
+        texts = []
+        for json_file in sorted(iter_json_files(corpus_path)):
+            data = load_transcript(json_file)
+            texts.extend(item["transcription"] for item in data.get("transcription", []))
+        return texts
+
+    rng = random.Random(seed)
+    texts = []
+    for _ in range(segments):
+        words = rng.choices(FILLER_WORDS, k=rng.randint(8, 30))
+        for _ in range(rng.randint(0, 2)):
+            words.insert(rng.randrange(len(words) + 1), rng.choice(MAGIC_PHRASES))
+        texts.append(" ".join(words).capitalize() + ".")
+    return texts
+
+
+def legacy_count(text: str) -> Counter:
+    """Contagem da implementação anterior: uma busca por padrão."""
+    text_lower = text.lower()
+    counts = Counter()
+    for root, pattern in LEGACY_MAGIC_WORD_PATTERNS.items():
+        counts[root] += len(pattern.findall(text_lower))
+    return counts
+
+
+def compare_magic_words(args) -> dict:
+    """Compara o matcher de passada única com as regex separadas por raiz."""
+    texts = load_corpus(args.corpus, args.segments)
+    matcher = load_matcher(args.lexicon)
+    characters = sum(len(text) for text in texts)
+    report = {"segments": len(texts), "characters": characters, "modes": {}}
+    for name, count in (("legacy", legacy_count), ("matcher", matcher.count)):
+        best = None
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            total = Counter()
+            for text in texts:
+                total.update(count(text))
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        report["modes"][name] = {
+            "seconds": best,
+            "segments_per_sec": len(texts) / best if best else 0.0,
+            "mb_per_sec": characters / best / 1e6 if best else 0.0,
+            "matches": sum(total.values()),
+        }
+    report["speedup"] = report["modes"]["legacy"]["seconds"] / report["modes"]["matcher"]["seconds"]
+    return report
+
+
+def synthetic_audio_set(output_path: str, files: int, seconds: float, seed: int = 0) -> list:
+    """Gera WAVs reprodutíveis (16 kHz, mono) com "sílabas" harmônicas e pausas.
+
+    Não é fala real, mas tem envelope e pausas parecidos com os de uma
+    ligação, o que basta para comparar configurações entre versões.
+    """
+    import numpy as np
+
+    os.makedirs(output_path, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    audio_files = []
+    for index in range(files):
+        samples = int(seconds * SAMPLING_RATE)
+        t = np.arange(samples) / SAMPLING_RATE
+        pitch = 110 + 40 * np.sin(2 * np.pi * 0.3 * t + rng.uniform(0, np.pi))
+        phase = 2 * np.pi * np.cumsum(pitch) / SAMPLING_RATE
+        voice = sum(np.sin(k * phase) / k for k in range(1, 6))
+        syllables = np.clip(np.sin(2 * np.pi * 4 * t + rng.uniform(0, np.pi)), 0, None)
+        pauses = np.repeat(rng.random(int(seconds) + 1) > 0.3, SAMPLING_RATE)[:samples]
+        signal = voice * syllables * pauses + rng.normal(0, 0.01, samples)
+        pcm = (signal / np.max(np.abs(signal)) * 0.6 * 32767).astype(np.int16)
+
+        audio_file = os.path.join(output_path, f"synthetic_{index:03d}.wav")
+        with wave.open(audio_file, "wb") as f:
+            f.setnchannels(1)
+            f.setsampwidth(2)
+            f.setframerate(SAMPLING_RATE)
+            f.writeframes(pcm.tobytes())
+        audio_files.append(audio_file)
+    return audio_files
+
+
+def stage_seconds(snapshot: dict) -> dict:
+    """Tempo total de cada `telemetry.stage` registrado em um snapshot."""
+    seconds = {}
+    for (name, labels), values in snapshot["histograms"]:
+        if name == "recogni_stage_seconds":
+            seconds[dict(labels)["stage"]] = values[-2]
+    return seconds
+
+
+def run_config(
+    config: dict, audio_files: list, prompt: str, cpu_threads: int, options: dict = None
+) -> dict:
+    """Executa uma configuração da matriz (em um processo próprio) e mede cada estágio.
+
+    Os arquivos passam pelo mesmo `process_file_result` da linha de comando, e
+    os tempos vêm dos `telemetry.stage` que ele já registra (transcrição,
+    análise e gravação), então VAD, separação de falantes e formatos de saída
+    (`options`) entram na medição.
+    """
+    options = options or {}
+    agent_channel = options.get("agent_channel")
+    telemetry.snapshot(reset=True)
+    model = load_model(
+        config["model_size"], "cpu", config["compute_type"], cpu_threads,
+        num_workers=channel_workers(agent_channel),
+    )
+    matcher = load_matcher()
+    files = 0
+    with tempfile.TemporaryDirectory() as output_path:
+        recogni.JSON_PATH = output_path
+        for audio_file in audio_files:
+            files += bool(
+                process_file_result(
+                    audio_file, prompt, model, config["beam_size"], 0, None, False, matcher,
+                    options.get("vad_parameters"), options.get("output_format", "json"),
+                    agent_channel,
+                )
+            )
+    snapshot = telemetry.snapshot(reset=True)
+
+    stages = stage_seconds(snapshot)
+    model_load = stages.pop("model_load", 0.0)
+    audio_seconds = sum(
+        value for (name, _), value in snapshot["counters"] if name == "recogni_audio_seconds_total"
+    )
+    processing = sum(stages.values())
+    return {
+        **config,
+        "files_ok": files,
+        "model_load_seconds": model_load,
+        "audio_seconds": audio_seconds,
+        "stage_seconds": stages,
+        "rtf": processing / audio_seconds if audio_seconds else None,
+        "files_per_hour": len(audio_files) / processing * 3600 if processing else None,
+        # ru_maxrss é informado em KB no Linux.
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+
+
+def run_matrix(args) -> dict:
+    """Roda a matriz de `model_size` x `compute_type` x `beam_size` em CPU."""
+    if args.audio_path:
+        audio_files = find_audio_files(args.audio_path)
+    else:
+        audio_files = synthetic_audio_set(
+            args.synthetic_path, args.synthetic_files, args.synthetic_seconds
+        )
+    if not audio_files:
+        raise ValueError(f"Nenhum arquivo de áudio encontrado em {args.audio_path}")
+
+    import ctranslate2
+    import faster_whisper
+
+    options = {
+        "output_format": args.output_format,
+        "vad_parameters": build_vad_parameters() if args.vad else None,
+        "agent_channel": 0 if args.speakers else None,
+    }
+    report = {
+        "created_at": datetime.now().isoformat(),
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "faster_whisper": faster_whisper.__version__,
+            "ctranslate2": ctranslate2.__version__,
+        },
+        "audio_files": audio_files,
+        "options": options,
+        "results": [],
+    }
+    # Cada configuração roda em um processo novo: o pico de memória e o tempo
+    # de carga do modelo não são afetados pelas execuções anteriores.
+    context = multiprocessing.get_context("spawn")
+    for model_size, compute_type, beam_size in itertools.product(
+        args.model_sizes, args.compute_types, args.beam_sizes
+    ):
+        config = {"model_size": model_size, "compute_type": compute_type, "beam_size": beam_size}
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+            result = executor.submit(
+                run_config, config, audio_files, args.prompt, args.cpu_threads, options
+            ).result()
+        print(
+            f"{model_size} {compute_type} beam={beam_size}: RTF {result['rtf']:.3f}, "
+            f"{result['files_per_hour']:.0f} arquivos/h, {result['peak_rss_mb']:.0f} MB"
+        )
+        report["results"].append(result)
+    return report
+
+
+def parse_importtime(stderr: str) -> list:
+    """Linhas de `python -X importtime` como (módulo, microssegundos acumulados)."""
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|", 2)
+        imports.append((name.strip(), int(cumulative)))
+    return imports
+
+
+def run_imports(args) -> dict:
+    """Tempo de importação de cada ponto de entrada, medido em um processo novo."""
+    app_dir = os.path.dirname(os.path.abspath(__file__))
+    report = {"created_at": datetime.now().isoformat(), "results": []}
+    for module in args.modules:
+        start = time.perf_counter()
+        completed = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+            cwd=app_dir,
+            capture_output=True,
+            text=True,
+        )
+        wall = time.perf_counter() - start
+        if completed.returncode != 0:
+            raise RuntimeError(f"Falha ao importar {module}: {completed.stderr.splitlines()[-1:]}")
+        imports = parse_importtime(completed.stderr)
+        top_level = {name.split(".")[0] for name, _ in imports}
+        result = {
+            "module": module,
+            "wall_seconds": wall,
+            "import_seconds": max((cumulative for _, cumulative in imports), default=0) / 1e6,
+            "azure_imported": "azure" in top_level,
+            "torch_imported": "torch" in top_level,
+            "slowest": [
+                {"module": name, "seconds": cumulative / 1e6}
+                for name, cumulative in sorted(imports, key=lambda item: -item[1])[: args.top]
+            ],
+        }
+        print(
+            f"{module}: {wall:.2f} s (azure={result['azure_imported']}, torch={result['torch_imported']})"
+        )
+        report["results"].append(result)
+    return report
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Benchmarks do Recogni")
+    parser.add_argument("--output", help="Arquivo para salvar o relatório em JSON")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    batched = subparsers.add_parser(
+        "batched", help="Fator de tempo real do modo sequencial contra o modo em lote"
+    )
+    batched.add_argument(
+        "--audio_path", required=True, help="Diretório com o conjunto fixo de amostras"
+    )
+    batched.add_argument(
+        "--prompt",
+        default="Essa é uma transcrição de uma ligação para avaliação de NPS da empresa TOTVS.",
+    )
+    batched.add_argument("--model_size", default="large-v3")
+    batched.add_argument("--beam_size", type=int, default=5)
+    batched.add_argument("--batch_size", type=int, default=16)
+    batched.add_argument("--device", default="cpu")
+    batched.add_argument("--compute_type", default="int8")
+    batched.add_argument("--cpu_threads", type=int, default=0)
+    batched.set_defaults(run=compare_batched)
+
+    magic_words = subparsers.add_parser(
+        "magic_words", help="Contagem de palavras mágicas: matcher único contra regex por raiz"
+    )
+    magic_words.add_argument(
+        "--corpus", help="Diretório com JSONs de transcrição (padrão: corpus sintético)"
+    )
+    magic_words.add_argument(
+        "--segments", type=int, default=200000, help="Segmentos do corpus sintético"
+    )
+    magic_words.add_argument("--repeat", type=int, default=3)
+    magic_words.add_argument("--lexicon", default=DEFAULT_LEXICON)
+    magic_words.set_defaults(run=compare_magic_words)
+
+    matrix = subparsers.add_parser(
+        "matrix", help="RTF, arquivos/hora, memória e tempo por estágio para cada configuração"
+    )
+    matrix.add_argument(
+        "--audio_path", help="Diretório com as amostras (padrão: conjunto sintético)"
+    )
+    matrix.add_argument("--synthetic_path", default="./benchmark_audio")
+    matrix.add_argument("--synthetic_files", type=int, default=5)
+    matrix.add_argument("--synthetic_seconds", type=float, default=60)
+    matrix.add_argument(
+        "--prompt",
+        default="Essa é uma transcrição de uma ligação para avaliação de NPS da empresa TOTVS.",
+    )
+    matrix.add_argument("--model_sizes", nargs="+", default=["tiny", "base", "small"])
+    matrix.add_argument("--compute_types", nargs="+", default=["int8", "float32"])
+    matrix.add_argument("--beam_sizes", nargs="+", type=int, default=[1, 5])
+    matrix.add_argument("--cpu_threads", type=int, default=0)
+    matrix.add_argument(
+        "--output_format", choices=sorted(FORMATS), default="json", help="Formato do resultado"
+    )
+    matrix.add_argument("--vad", action="store_true", help="Mede com o filtro de voz ativo")
+    matrix.add_argument(
+        "--speakers", action="store_true", help="Mede com a separação de falantes por canal"
+    )
+    matrix.set_defaults(run=run_matrix)
+
+    imports = subparsers.add_parser(
+        "imports", help="Tempo de inicialização (importação) de cada ponto de entrada"
+    )
+    imports.add_argument(
+        "--modules", nargs="+", default=["recogni", "server", "reanalyze", "aggregation"]
+    )
+    imports.add_argument("--top", type=int, default=10, help="Importações mais lentas listadas")
+    imports.set_defaults(run=run_imports)
+
+    args = parser.parse_args(argv)
+
+    report = args.run(args)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            ujson.dump(report, f, ensure_ascii=False, indent=4)
+    print(ujson.dumps(report, ensure_ascii=False, indent=4))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,293 @@
+import fcntl
+import hashlib
+import logging
+import os
+import socket
+import threading
+import time
+
+from typing import Dict, Iterable, Iterator, Optional, Tuple
+
+from telemetry import telemetry
+
+
+# Limites da duração de um lease finito no Azure Blob Storage.
+MIN_LEASE_SECONDS = 15
+MAX_LEASE_SECONDS = 60
+# Intervalo entre as novas tentativas de reivindicar arquivos que estavam com
+# outro processo (o lease de um nó que caiu expira em até MAX_LEASE_SECONDS).
+RECHECK_SECONDS = MIN_LEASE_SECONDS
+
+
+def node_id() -> str:
+    """Identificação deste processo nas reivindicações (host e PID)."""
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+def parse_shard(value: str) -> Tuple[int, int]:
+    """Converte `--shard I/N` em (I, N), com 0 <= I < N."""
+    try:
+        index, count = (int(part) for part in value.split("/"))
+    except ValueError:
+        raise ValueError(f"Shard inválido: {value} (use I/N, por exemplo 0/4)")
+    if count < 1 or not 0 <= index < count:
+        raise ValueError(f"Shard inválido: {value} (I deve estar entre 0 e N-1)")
+    return index, count
+
+
+def shard_of(name: str, count: int) -> int:
+    """Shard dono de `name` por hashing de rendezvous.
+
+    Cada shard recebe uma nota pseudoaleatória por nome e o de maior nota é o
+    dono. Ao mudar o número de shards, só os nomes do shard criado ou removido
+    mudam de dono (cerca de 1/N), como em um anel de hashing consistente.
+    """
+    return max(
+        range(count), key=lambda shard: hashlib.sha1(f"{shard}:{name}".encode("utf-8")).digest()
+    )
+
+
+def in_shard(name: str, shard: Optional[Tuple[int, int]]) -> bool:
+    return shard is None or shard_of(name, shard[1]) == shard[0]
+
+
+class FileClaims:
+    """Reivindicações em um diretório local com `flock`, para vários processos na mesma máquina.
+
+    Cada nome tem um arquivo `.lock` travado enquanto o processo trabalha nele
+    e um `.done` gravado ao concluir. O sistema operacional libera a trava se o
+    processo morrer, então o arquivo volta a ficar disponível sem intervenção.
+    Em volumes de rede, use apenas se o sistema de arquivos suportar `flock`.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        self._held: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    def _path(self, name: str, suffix: str) -> str:
+        path = os.path.join(self.root, name + suffix)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        return path
+
+    def is_done(self, name: str) -> bool:
+        return os.path.exists(self._path(name, ".done"))
+
+    def claim(self, name: str) -> bool:
+        """Tenta reivindicar `name`; False se já concluído ou com outro processo."""
+        if os.path.exists(self._path(name, ".done")):
+            return False
+        fd = os.open(self._path(name, ".lock"), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+        # Outro processo pode ter concluído entre a verificação e a trava.
+        if os.path.exists(self._path(name, ".done")):
+            os.close(fd)
+            return False
+        os.ftruncate(fd, 0)
+        os.write(fd, node_id().encode("utf-8"))
+        with self._lock:
+            self._held[name] = fd
+        return True
+
+    def done(self, name: str) -> None:
+        """Marca `name` como concluído e libera a trava."""
+        with open(self._path(name, ".done"), "w", encoding="utf-8") as f:
+            f.write(node_id())
+        self.release(name)
+
+    def release(self, name: str) -> None:
+        """Libera `name` sem concluí-lo (outro processo pode tentar de novo)."""
+        with self._lock:
+            fd = self._held.pop(name, None)
+        if fd is not None:
+            os.close(fd)
+
+    def close(self) -> None:
+        for name in list(self._held):
+            self.release(name)
+
+
+class BlobLeaseClaims:
+    """Reivindicações com leases de blob, para vários nós sobre o mesmo contêiner.
+
+    Cada nome tem um blob vazio no contêiner de reivindicações. Um nó reivindica
+    o nome adquirindo um lease finito nesse blob, renovado em segundo plano
+    enquanto o trabalho dura; ao concluir, grava `status=done` nos metadados e
+    libera o lease. Se o nó cair, o lease expira em `lease_seconds` e outro nó
+    assume o arquivo. Funciona também contra o Azurite.
+    """
+
+    def __init__(self, connection_string: str, container_name: str, lease_seconds: int = 60):
+        """Inicializa as reivindicações.
+
+        Args:
+            connection_string (str): A string de conexão do Azure Blob Storage.
+            container_name (str): O contêiner dos blobs de reivindicação (criado se preciso).
+            lease_seconds (int): Duração do lease (15 a 60 s); um nó que cair
+                libera seus arquivos nesse prazo.
+        """
+        from azure.core.exceptions import HttpResponseError, ResourceExistsError
+        from azure.storage.blob import BlobServiceClient
+
+        if not MIN_LEASE_SECONDS <= lease_seconds <= MAX_LEASE_SECONDS:
+            raise ValueError(
+                f"lease_seconds deve estar entre {MIN_LEASE_SECONDS} e {MAX_LEASE_SECONDS}"
+            )
+        self._errors = (HttpResponseError, ResourceExistsError)
+        self.lease_seconds = lease_seconds
+        self.node = node_id()
+        self._container = BlobServiceClient.from_connection_string(
+            connection_string
+        ).get_container_client(container_name)
+        try:
+            self._container.create_container()
+        except ResourceExistsError:
+            pass
+        self._held = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._renewer = threading.Thread(target=self._renew_loop, name="claims-renew", daemon=True)
+        self._renewer.start()
+
+    def _is_done(self, blob_client) -> bool:
+        return blob_client.get_blob_properties().metadata.get("status") == "done"
+
+    def is_done(self, name: str) -> bool:
+        try:
+            return self._is_done(self._container.get_blob_client(name))
+        except self._errors:
+            return False
+
+    def claim(self, name: str) -> bool:
+        """Tenta reivindicar `name`; False se já concluído ou com lease de outro nó."""
+        blob_client = self._container.get_blob_client(name)
+        try:
+            blob_client.upload_blob(b"", overwrite=False)
+        except self._errors:
+            pass
+        try:
+            if self._is_done(blob_client):
+                return False
+            lease = blob_client.acquire_lease(lease_duration=self.lease_seconds)
+        except self._errors:
+            return False
+        # Outro nó pode ter concluído entre a leitura e o lease.
+        if self._is_done(blob_client):
+            lease.release()
+            return False
+        with self._lock:
+            self._held[name] = (blob_client, lease)
+        telemetry.inc("recogni_claims_total", event="acquired")
+        return True
+
+    def _renew_loop(self) -> None:
+        # Renova bem antes da expiração para tolerar atrasos de rede.
+        while not self._stop.wait(self.lease_seconds / 3):
+            with self._lock:
+                held = list(self._held.items())
+            for name, (_, lease) in held:
+                try:
+                    lease.renew()
+                except Exception as e:
+                    logging.warning(f"Lease de {name} perdido, outro nó pode assumi-lo: {e}")
+                    with self._lock:
+                        self._held.pop(name, None)
+                    telemetry.inc("recogni_claims_total", event="lost")
+
+    def done(self, name: str) -> None:
+        """Marca `name` como concluído nos metadados e libera o lease."""
+        with self._lock:
+            held = self._held.pop(name, None)
+        if held is None:
+            return
+        blob_client, lease = held
+        try:
+            blob_client.set_blob_metadata(
+                {"status": "done", "node": self.node, "finished_at": str(time.time())}, lease=lease
+            )
+        finally:
+            lease.release()
+
+    def release(self, name: str) -> None:
+        """Libera o lease de `name` sem concluí-lo (outro nó pode tentar de novo)."""
+        with self._lock:
+            held = self._held.pop(name, None)
+        if held is not None:
+            try:
+                held[1].release()
+            except Exception as e:
+                logging.warning(f"Não foi possível liberar o lease de {name}: {e}")
+
+    def close(self) -> None:
+        self._stop.set()
+        for name in list(self._held):
+            self.release(name)
+
+
+def reclaim(pending: Dict[str, object], claims, interval: float = RECHECK_SECONDS) -> Iterator:
+    """Tenta de novo os itens que estavam com outro processo, até não sobrar nenhum.
+
+    `pending` mapeia nome -> item. Os já concluídos saem da lista; os demais são
+    reivindicados a cada `interval` segundos, e os que ficarem livres (por
+    exemplo, porque o nó que os segurava caiu e o lease expirou) são repassados.
+    """
+    while True:
+        for name in [name for name in pending if claims.is_done(name)]:
+            del pending[name]
+        if not pending:
+            return
+        time.sleep(interval)
+        for name, item in list(pending.items()):
+            if claims.claim(name):
+                del pending[name]
+                yield item
+
+
+def claimed(
+    audio_files: Iterable[str],
+    claims=None,
+    shard: Optional[Tuple[int, int]] = None,
+    name_of=str,
+    interval: float = RECHECK_SECONDS,
+    skipped: Dict[str, object] = None,
+) -> Iterator[str]:
+    """Repassa apenas os arquivos do shard que este processo conseguiu reivindicar.
+
+    A reivindicação acontece quando o arquivo é pedido, então um processo só
+    segura os arquivos que está prestes a processar e os demais ficam livres
+    para os outros. Os que estavam com outro processo são tentados de novo
+    depois da primeira passada (ver `reclaim`); com `skipped`, eles são apenas
+    guardados nesse dicionário, para quem chama tentá-los quando quiser.
+    """
+    retry = skipped is None
+    if retry:
+        skipped = {}
+    for audio_file in audio_files:
+        name = name_of(audio_file)
+        if not in_shard(name, shard):
+            continue
+        if claims is not None and not claims.claim(name):
+            skipped[name] = audio_file
+            continue
+        yield audio_file
+    if claims is not None and retry:
+        yield from reclaim(skipped, claims, interval)
+
+
+def open_claims(backend: str, path: str = None, lease_seconds: int = 60):
+    """Cria as reivindicações de `--claims`: "file" (diretório local) ou "blob" (leases).
+
+    `path` é o diretório das travas ou o contêiner dos blobs de reivindicação.
+    """
+    if backend == "file":
+        return FileClaims(path or "./claims")
+    return BlobLeaseClaims(
+        os.environ["STORAGE_ACCOUNT_KEY"],
+        path or os.environ.get("CONTAINER_CLAIMS", "recogni-claims"),
+        lease_seconds,
+    )
@@ -0,0 +1,107 @@
+import os
+import re
+import unicodedata
+
+from collections import Counter
+from functools import lru_cache
+from typing import Dict, List
+
+
+DEFAULT_LEXICON = os.path.join(os.path.dirname(os.path.abspath(__file__)), "magic_words.txt")
+
+
+def normalize(text: str) -> str:
+    """Converte para minúsculas e remove acentos (ex.: "Agradeço" -> "agradeco").
+
+    Caracteres sem equivalente ASCII são descartados.
+    """
+    return unicodedata.normalize("NFKD", text.lower()).encode("ascii", "ignore").decode("ascii")
+
+
+def load_lexicon(path: str) -> Dict[str, List[str]]:
+    """Lê um léxico no formato `categoria: variante, variante` (uma por linha)."""
+    lexicon = {}
+    with open(path, "r", encoding="utf-8") as f:
+        for line_number, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            category, separator, variants = line.partition(":")
+            if not separator:
+                raise ValueError(f"Linha {line_number} inválida no léxico {path}: {line}")
+            variants = [variant.strip() for variant in variants.split(",") if variant.strip()]
+            lexicon.setdefault(category.strip(), []).extend(variants or [category.strip()])
+    return lexicon
+
+
+class MagicWordMatcher:
+    """Conta as "palavras mágicas" de um texto em uma única passada.
+
+    Todas as variantes do léxico são organizadas em uma trie (como em
+    Aho-Corasick) e compiladas em uma só expressão regular, aplicada ao texto
+    normalizado (sem acentos e em minúsculas). Cada variante termina em um grupo
+    vazio que identifica sua categoria, e a expressão prefere a variante mais
+    longa ("muito obrigado" conta uma vez). O objeto é imutável depois de criado
+    e pode ser compartilhado entre threads; cada chamada devolve suas próprias
+    contagens.
+    """
+
+    def __init__(self, lexicon: Dict[str, List[str]]):
+        """Compila o léxico.
+
+        Args:
+            lexicon (dict): Variantes de cada categoria, ex.
+                {"obrigado": ["obrigado", "obrigada"]}.
+        """
+        self.categories = list(lexicon)
+        trie = {}
+        for category, words in lexicon.items():
+            for word in words:
+                node = trie
+                for char in " ".join(normalize(word).split()):
+                    node = node.setdefault(char, {})
+                node.setdefault("", category)
+        if not trie:
+            raise ValueError("O léxico de palavras mágicas está vazio")
+
+        self._group_categories = []
+        self._pattern = re.compile(rf"(?<!\w){self._compile(trie)}(?!\w)")
+
+    def _compile(self, node: dict) -> str:
+        """Converte um nó da trie em regex; o grupo vazio marca o fim de uma variante."""
+        alternatives = [
+            (r"\s+" if char == " " else re.escape(char)) + self._compile(child)
+            for char, child in sorted(node.items())
+            if char
+        ]
+        if "" in node:
+            self._group_categories.append(node[""])
+            alternatives.append("()")
+        if len(alternatives) == 1:
+            return alternatives[0]
+        return "(?:" + "|".join(alternatives) + ")"
+
+    @classmethod
+    def from_file(cls, path: str = DEFAULT_LEXICON) -> "MagicWordMatcher":
+        """Cria o matcher a partir de um arquivo de léxico."""
+        return cls(load_lexicon(path))
+
+    def count(self, text: str) -> Counter:
+        """Conta as ocorrências de cada categoria no texto."""
+        counts = Counter()
+        for match in self._pattern.finditer(normalize(text)):
+            counts[self._group_categories[match.lastindex - 1]] += 1
+        return counts
+
+    def percentages(self, counts: Counter, total_words: int) -> dict:
+        """Percentual de cada categoria em relação ao total de palavras."""
+        return {
+            category: (counts.get(category, 0) / total_words) * 100
+            for category in self.categories
+        }
+
+
+@lru_cache(maxsize=None)
+def load_matcher(path: str = DEFAULT_LEXICON) -> MagicWordMatcher:
+    """Carrega (uma vez por processo) o matcher de um arquivo de léxico."""
+    return MagicWordMatcher.from_file(path)
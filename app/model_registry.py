@@ -0,0 +1,240 @@
+import argparse
+import hashlib
+import logging
+import os
+import shutil
+import time
+import ujson
+
+from typing import Dict, List
+
+
+# Arquivo, dentro do diretório de cada modelo, com o tamanho e o SHA-256 de
+# cada arquivo gravado no `prefetch`.
+CHECKSUMS_FILENAME = "checksums.json"
+
+# Arquivos copiados do modelo original na conversão para CTranslate2.
+CONVERTER_COPY_FILES = ["tokenizer.json", "preprocessor_config.json"]
+
+
+def file_sha256(path: str, chunk_size: int = 1 << 20) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def model_files(model_path: str) -> List[str]:
+    """Arquivos do modelo, relativos ao diretório (ignora ocultos e o próprio checksums.json)."""
+    files = []
+    for root, dirs, names in os.walk(model_path):
+        dirs[:] = [name for name in dirs if not name.startswith(".")]
+        for name in names:
+            if name.startswith(".") or name == CHECKSUMS_FILENAME:
+                continue
+            files.append(os.path.relpath(os.path.join(root, name), model_path))
+    return sorted(files)
+
+
+class ModelRegistry:
+    """Diretório local de modelos CTranslate2, um subdiretório por modelo.
+
+    Cada modelo é gravado uma única vez (`prefetch`) com o `checksums.json` dos
+    seus arquivos; depois disso os nós carregam o modelo direto do diretório,
+    sem acessar a rede, o que permite compartilhá-lo como volume somente leitura.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def path(self, name: str) -> str:
+        """Diretório do modelo `name` (tamanho, como `large-v3`, ou ID do Hugging Face)."""
+        return os.path.join(self.root, name.replace("/", "--"))
+
+    def models(self) -> Dict[str, dict]:
+        """Modelos registrados e seus metadados (origem, quantização, tamanho)."""
+        models = {}
+        if not os.path.isdir(self.root):
+            return models
+        for name in sorted(os.listdir(self.root)):
+            checksums_file = os.path.join(self.root, name, CHECKSUMS_FILENAME)
+            if os.path.isfile(checksums_file):
+                with open(checksums_file, "r", encoding="utf-8") as f:
+                    models[name] = ujson.load(f)
+        return models
+
+    def verify(self, name: str, full: bool = True) -> List[str]:
+        """Problemas encontrados no modelo (lista vazia se íntegro).
+
+        Sem `full`, confere apenas a presença e o tamanho de cada arquivo, o que é
+        instantâneo mesmo em modelos grandes; com `full`, recalcula os SHA-256.
+        """
+        model_path = self.path(name)
+        checksums_file = os.path.join(model_path, CHECKSUMS_FILENAME)
+        if not os.path.isfile(checksums_file):
+            return [f"{checksums_file} não encontrado"]
+        with open(checksums_file, "r", encoding="utf-8") as f:
+            expected = ujson.load(f)["files"]
+        problems = []
+        for relative_path, entry in expected.items():
+            file_path = os.path.join(model_path, relative_path)
+            if not os.path.isfile(file_path):
+                problems.append(f"{relative_path}: ausente")
+            elif os.path.getsize(file_path) != entry["size"]:
+                problems.append(f"{relative_path}: tamanho diferente do registrado")
+            elif full and file_sha256(file_path) != entry["sha256"]:
+                problems.append(f"{relative_path}: SHA-256 diferente do registrado")
+        return problems
+
+    def resolve(self, name: str, verify: bool = False) -> str:
+        """Caminho local do modelo, conferido contra o `checksums.json`.
+
+        Nunca baixa nada: um modelo ausente deve ser obtido antes com `prefetch`.
+        """
+        model_path = self.path(name)
+        if not os.path.isdir(model_path):
+            raise FileNotFoundError(
+                f"Modelo {name} não encontrado em {self.root}. "
+                f"Use 'python recogni.py models prefetch {name} --model_dir {self.root}'"
+            )
+        problems = self.verify(name, full=verify)
+        if problems:
+            raise ValueError(f"Modelo {name} em {model_path} corrompido: {'; '.join(problems)}")
+        return model_path
+
+    def prefetch(
+        self,
+        name: str,
+        convert_from: str = None,
+        quantization: str = None,
+        force: bool = False,
+    ) -> str:
+        """Baixa (ou converte) o modelo para o registro e grava os checksums.
+
+        Sem `convert_from`, baixa o modelo já convertido do Hugging Face Hub. Com
+        `convert_from` (modelo Transformers, como `openai/whisper-large-v3`), o
+        modelo é convertido com o `quantization` informado (por exemplo, `int8`),
+        o que reduz o tamanho em disco e o tempo de carga. Um modelo já presente
+        e íntegro não é baixado de novo.
+        """
+        model_path = self.path(name)
+        if os.path.isdir(model_path) and not force:
+            problems = self.verify(name)
+            if not problems:
+                logging.info(f"Modelo {name} já presente em {model_path}")
+                return model_path
+            logging.warning(f"Modelo {name} em {model_path} será baixado de novo: {problems}")
+
+        # O download é feito em um diretório temporário e só recebe o nome final
+        # com os checksums gravados, então um prefetch interrompido não é usado.
+        partial_path = model_path + ".partial"
+        shutil.rmtree(partial_path, ignore_errors=True)
+        os.makedirs(self.root, exist_ok=True)
+        start = time.perf_counter()
+        if convert_from:
+            try:
+                from ctranslate2.converters import TransformersConverter
+            except ImportError:
+                raise RuntimeError("A conversão requer o pacote 'transformers' (pip install transformers)")
+            TransformersConverter(convert_from, copy_files=CONVERTER_COPY_FILES).convert(
+                partial_path, quantization=quantization
+            )
+        else:
+            from faster_whisper.utils import download_model
+
+            download_model(name, output_dir=partial_path)
+        # O Hub grava metadados próprios em `.cache` dentro do diretório.
+        shutil.rmtree(os.path.join(partial_path, ".cache"), ignore_errors=True)
+
+        files = {}
+        for relative_path in model_files(partial_path):
+            file_path = os.path.join(partial_path, relative_path)
+            files[relative_path] = {
+                "size": os.path.getsize(file_path),
+                "sha256": file_sha256(file_path),
+            }
+        with open(os.path.join(partial_path, CHECKSUMS_FILENAME), "w", encoding="utf-8") as f:
+            ujson.dump(
+                {
+                    "name": name,
+                    "source": convert_from or name,
+                    "quantization": quantization,
+                    "created_at": time.time(),
+                    "files": files,
+                },
+                f,
+                indent=4,
+            )
+        shutil.rmtree(model_path, ignore_errors=True)
+        os.replace(partial_path, model_path)
+        size_mb = sum(entry["size"] for entry in files.values()) / 2**20
+        logging.info(
+            f"Modelo {name} gravado em {model_path} ({size_mb:.0f} MB, "
+            f"{time.perf_counter() - start:.1f} s)"
+        )
+        return model_path
+
+
+def resolve_model(model_size: str, model_dir: str = None, verify: bool = False) -> str:
+    """O que passar ao `WhisperModel`: o diretório local do modelo ou o próprio nome.
+
+    Sem `model_dir`, usa `$MODEL_DIR` (por exemplo, um volume compartilhado
+    somente leitura), lido na chamada para valer também quando vem do `.env`.
+    Sem nenhum dos dois, mantém o comportamento do faster-whisper (cache do
+    Hugging Face, com download na primeira execução).
+    """
+    model_dir = model_dir or os.environ.get("MODEL_DIR")
+    if not model_dir:
+        return model_size
+    return ModelRegistry(model_dir).resolve(model_size, verify)
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Registro local de modelos CTranslate2")
+    parser.add_argument(
+        "--model_dir",
+        default=None,
+        help="Diretório dos modelos (padrão: $MODEL_DIR ou ./models)",
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    prefetch = subparsers.add_parser("prefetch", help="Baixa ou converte modelos para o registro")
+    prefetch.add_argument("names", nargs="+", help="Modelos (por exemplo, large-v3)")
+    prefetch.add_argument(
+        "--convert_from", help="Modelo Transformers a converter (um único nome por vez)"
+    )
+    prefetch.add_argument(
+        "--quantization", help="Quantização na conversão (int8, int8_float16, float16...)"
+    )
+    prefetch.add_argument("--force", action="store_true", help="Baixa mesmo se já presente")
+
+    verify = subparsers.add_parser("verify", help="Confere os SHA-256 dos modelos registrados")
+    verify.add_argument("names", nargs="*", help="Modelos a conferir (padrão: todos)")
+
+    subparsers.add_parser("list", help="Lista os modelos registrados")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+
+    registry = ModelRegistry(args.model_dir or os.environ.get("MODEL_DIR") or "./models")
+    if args.command == "prefetch":
+        if args.convert_from and len(args.names) > 1:
+            parser.error("--convert_from aceita um único modelo")
+        for name in args.names:
+            print(registry.prefetch(name, args.convert_from, args.quantization, args.force))
+    elif args.command == "verify":
+        failed = False
+        for name in args.names or list(registry.models()):
+            problems = registry.verify(name)
+            print(f"{name}: {'ok' if not problems else '; '.join(problems)}")
+            failed = failed or bool(problems)
+        if failed:
+            raise SystemExit(1)
+    else:
+        for name, entry in registry.models().items():
+            size_mb = sum(file["size"] for file in entry["files"].values()) / 2**20
+            print(f"{name}\t{entry['source']}\t{entry.get('quantization') or '-'}\t{size_mb:.0f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+import logging
+import queue
+import threading
+
+from typing import Any, Callable, Iterable, List, Optional
+
+from telemetry import telemetry
+
+
+# Marca o fim de uma fila para os consumidores.
+_DONE = object()
+
+
+class StreamingPipeline:
+    """Pipeline produtor/consumidor que sobrepõe download, transcrição e upload.
+
+    Uma thread consome `source` (por exemplo, `iter_blobs`) e coloca cada áudio
+    baixado em uma fila limitada; a thread chamadora transcreve os arquivos na
+    ordem em que chegam e entrega cada resultado a uma segunda fila limitada,
+    consumida por threads que executam os `sinks` (Cosmos DB, Blob Storage).
+    Filas cheias bloqueiam o estágio anterior, limitando disco e memória.
+
+    Como `source`, `process` e `sinks` são apenas iteráveis e funções, o pipeline
+    pode ser testado com um diretório local e sinks falsos, ou contra o Azurite.
+    """
+
+    def __init__(
+        self,
+        source: Iterable,
+        process: Callable[[str], Optional[Any]],
+        sinks: List[Callable[[str, Any], None]],
+        prefetch: int = 4,
+        upload_queue_size: int = 8,
+        upload_workers: int = 2,
+        on_complete: Callable[[str, bool], None] = None,
+    ):
+        """Inicializa o pipeline.
+
+        Args:
+            source (Iterable): Produz os caminhos locais dos áudios a processar.
+            process (Callable): Transcreve um áudio e retorna o resultado (por
+                exemplo, o caminho salvo e os dados), ou None em caso de falha.
+            sinks (list): Funções chamadas com (audio_path, resultado) para cada
+                áudio processado, executadas em segundo plano. Um sink falha se
+                levantar uma exceção ou retornar False.
+            prefetch (int): Máximo de áudios baixados aguardando transcrição.
+            upload_queue_size (int): Máximo de resultados aguardando upload.
+            upload_workers (int): Número de threads de upload.
+            on_complete (Callable): Chamada com (audio_path, ok) quando um áudio
+                sai do pipeline: ok é False se a transcrição ou algum sink falhou.
+        """
+        self.source = source
+        self.process = process
+        self.sinks = sinks
+        self.on_complete = on_complete or (lambda audio_path, ok: None)
+        self.upload_workers = max(1, upload_workers)
+        self.downloads = queue.Queue(maxsize=max(1, prefetch))
+        self.uploads = queue.Queue(maxsize=max(1, upload_queue_size))
+        self.stats = {"downloaded": 0, "processed": 0, "failed": 0, "uploaded": 0, "upload_errors": 0}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def _count(self, key: str) -> None:
+        with self._lock:
+            self.stats[key] += 1
+
+    def _report_depth(self) -> None:
+        """Publica a ocupação das filas como gauge `recogni_queue_depth`."""
+        telemetry.set_gauge("recogni_queue_depth", self.downloads.qsize(), queue="downloads")
+        telemetry.set_gauge("recogni_queue_depth", self.uploads.qsize(), queue="uploads")
+
+    def _put(self, target: queue.Queue, item) -> bool:
+        """Coloca um item na fila, desistindo se o pipeline for interrompido."""
+        while not self._stop.is_set():
+            try:
+                target.put(item, timeout=0.5)
+                self._report_depth()
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _download_loop(self) -> None:
+        try:
+            for audio_path in self.source:
+                self._count("downloaded")
+                if not self._put(self.downloads, audio_path):
+                    return
+        except Exception as e:
+            logging.error(f"Erro ao baixar arquivos de áudio: {e}")
+        finally:
+            self._put(self.downloads, _DONE)
+
+    def _upload_loop(self) -> None:
+        while True:
+            item = self.uploads.get()
+            self._report_depth()
+            if item is _DONE:
+                return
+            audio_path, result = item
+            ok = True
+            for sink in self.sinks:
+                try:
+                    # Os uploaders do Azure registram o erro e retornam False.
+                    if sink(audio_path, result) is False:
+                        ok = False
+                        logging.error(f"Falha ao enviar resultado de {audio_path}")
+                except Exception as e:
+                    ok = False
+                    logging.error(f"Erro ao enviar resultado de {audio_path}: {e}")
+            self._count("uploaded" if ok else "upload_errors")
+            self._complete(audio_path, ok)
+
+    def _complete(self, audio_path: str, ok: bool) -> None:
+        try:
+            self.on_complete(audio_path, ok)
+        except Exception as e:
+            logging.error(f"Erro ao concluir {audio_path}: {e}")
+
+    def run(self) -> dict:
+        """Executa o pipeline até esgotar a origem e todos os uploads."""
+        downloader = threading.Thread(target=self._download_loop, name="pipeline-download", daemon=True)
+        uploaders = [
+            threading.Thread(target=self._upload_loop, name=f"pipeline-upload-{i}", daemon=True)
+            for i in range(self.upload_workers)
+        ]
+        downloader.start()
+        for uploader in uploaders:
+            uploader.start()
+
+        try:
+            while True:
+                audio_path = self.downloads.get()
+                self._report_depth()
+                if audio_path is _DONE:
+                    break
+                result = self.process(audio_path)
+                if not result:
+                    self._count("failed")
+                    self._complete(str(audio_path), False)
+                    continue
+                self._count("processed")
+                self.uploads.put((str(audio_path), result))
+                self._report_depth()
+        except BaseException:
+            self._stop.set()
+            raise
+        finally:
+            for _ in uploaders:
+                self.uploads.put(_DONE)
+            for uploader in uploaders:
+                uploader.join()
+
+        logging.info(f"Pipeline concluído: {self.stats}")
+        return dict(self.stats)
+
+
+def run_pipeline(
+    source: Iterable,
+    process: Callable[[str], Optional[Any]],
+    sinks: List[Callable[[str, Any], None]],
+    **options,
+) -> dict:
+    """Atalho para montar e executar um `StreamingPipeline`."""
+    return StreamingPipeline(source, process, sinks, **options).run()
@@ -0,0 +1,161 @@
+import argparse
+import itertools
+import logging
+import os
+
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterable, Iterator, Tuple
+
+from analysis import analyze_transcription, timing_metrics
+from magic_words import DEFAULT_LEXICON, load_matcher
+from transcript_io import (
+    is_transcript,
+    load_transcript,
+    loads_transcript,
+    transcript_format,
+    write_transcript,
+)
+
+
+# Estado de cada processo do pool (ver _init_worker).
+_worker_matcher = None
+_worker_reader = None
+
+
+def _init_worker(lexicon: str, connection_string: str = None) -> None:
+    """Carrega o léxico (e o leitor do Blob Storage, se usado) uma vez por processo."""
+    global _worker_matcher, _worker_reader
+    _worker_matcher = load_matcher(lexicon)
+    if connection_string:
+        from azure_reader_stgacc import AzureBlobReader
+
+        _worker_reader = AzureBlobReader(connection_string)
+
+
+def reanalyze_data(data: dict, matcher=None) -> dict:
+    """Recalcula o bloco `metrics` de um resultado a partir da transcrição salva."""
+    data["metrics"] = analyze_transcription(
+        data.get("transcription", []), matcher, timing_metrics(data.get("metrics", {}))
+    )
+    return data
+
+
+def reanalyze_file(json_file: str) -> Tuple[str, bool]:
+    """Recalcula as métricas de um resultado local e o sobrescreve no mesmo formato."""
+    try:
+        data = load_transcript(json_file)
+        write_transcript(json_file, reanalyze_data(data, _worker_matcher))
+        return json_file, True
+    except Exception as e:
+        logging.error(f"Erro ao reanalisar {json_file}: {e}")
+        return json_file, False
+
+
+def reanalyze_blob(task: Tuple[str, str, str]) -> Tuple[str, bool]:
+    """Lê um resultado do Blob Storage, recalcula as métricas e o grava em `output_path`.
+
+    O arquivo local mantém o nome relativo do blob (com os prefixos), então
+    blobs de mesmo nome em pastas diferentes não se sobrescrevem.
+    """
+    container_name, blob_name, output_path = task
+    json_file = os.path.join(output_path, *blob_name.split("/"))
+    try:
+        if ".." in blob_name.split("/"):
+            raise ValueError("nome de blob fora do diretório de saída")
+        os.makedirs(os.path.dirname(json_file), exist_ok=True)
+        payload = _worker_reader.read_blob_bytes(container_name, blob_name)
+        data = loads_transcript(payload, transcript_format(blob_name))
+        write_transcript(json_file, reanalyze_data(data, _worker_matcher))
+        return json_file, True
+    except Exception as e:
+        logging.error(f"Erro ao reanalisar o blob {blob_name}: {e}")
+        return json_file, False
+
+
+def iter_json_files(json_path: str) -> Iterator[str]:
+    """Percorre os resultados (JSON, JSON Lines, gzip, msgpack) de um diretório sem montar a lista inteira."""
+    with os.scandir(json_path) as entries:
+        for entry in entries:
+            if entry.is_file() and is_transcript(entry.name):
+                yield entry.path
+
+
+def run_parallel(func, tasks: Iterable, workers: int, initargs: tuple, chunksize: int) -> list:
+    """Executa `func` sobre as tarefas em um pool, consumindo-as em blocos limitados."""
+    results = []
+    window = workers * chunksize * 4
+    tasks = iter(tasks)
+    with ProcessPoolExecutor(
+        max_workers=workers, initializer=_init_worker, initargs=initargs
+    ) as executor:
+        while True:
+            batch = list(itertools.islice(tasks, window))
+            if not batch:
+                break
+            results.extend(executor.map(func, batch, chunksize=chunksize))
+    return results
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(
+        description="Recalcula as métricas de transcrições existentes sem executar o Whisper"
+    )
+    parser.add_argument(
+        "--json_path", default="./json_files", help="Diretório com os JSONs de transcrição"
+    )
+    parser.add_argument(
+        "--from_blob",
+        action="store_true",
+        help="Lê os JSONs do contêiner CONTAINER_JSON e envia os resultados de volta",
+    )
+    parser.add_argument("--prefix", help="Prefixo dos blobs a reanalisar (com --from_blob)")
+    parser.add_argument(
+        "--lexicon", default=DEFAULT_LEXICON, help="Arquivo com o léxico de palavras mágicas"
+    )
+    parser.add_argument(
+        "--workers", type=int, default=os.cpu_count() or 1, help="Número de processos"
+    )
+    parser.add_argument("--chunksize", type=int, default=16, help="Arquivos por tarefa do pool")
+    args = parser.parse_args(argv)
+
+    workers = max(1, args.workers)
+    if args.from_blob:
+        from azure_reader_stgacc import AzureBlobReader
+        from azure_uploader_stgacc import AzureBlobUploader
+
+        connection_string = os.environ["STORAGE_ACCOUNT_KEY"]
+        container_name = os.environ["CONTAINER_JSON"]
+        os.makedirs(args.json_path, exist_ok=True)
+        blob_names = AzureBlobReader(connection_string).list_blob_names(
+            container_name, name_starts_with=args.prefix
+        )
+        tasks = (
+            (container_name, blob_name, args.json_path)
+            for blob_name in blob_names
+            if is_transcript(blob_name)
+        )
+        results = run_parallel(
+            reanalyze_blob, tasks, workers, (args.lexicon, connection_string), args.chunksize
+        )
+        # Cada resultado volta para o blob de origem, e não para a raiz do contêiner.
+        updated = {
+            json_file: os.path.relpath(json_file, args.json_path).replace(os.sep, "/")
+            for json_file, ok in results
+            if ok
+        }
+        AzureBlobUploader(connection_string, container_name).upload_files(
+            updated, overwrite=True, blob_names=updated
+        )
+    else:
+        results = run_parallel(
+            reanalyze_file, iter_json_files(args.json_path), workers, (args.lexicon,), args.chunksize
+        )
+
+    failed = sum(1 for _, ok in results if not ok)
+    message = f"Reanálise concluída: {len(results) - failed} arquivos atualizados, {failed} com erro"
+    logging.info(message)
+    print(message)
+
+
+if __name__ == "__main__":
+    main()
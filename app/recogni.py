@@ -1,36 +1,59 @@
 import argparse
+import importlib
 import logging
+import multiprocessing
 import os
-import ujson
-import re
+import sys
+import time
 
-from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 from datetime import datetime
 from pathlib import Path
-from typing import Tuple
-from torch import cuda
-from faster_whisper import WhisperModel
+from types import SimpleNamespace
+from typing import Callable, Optional, Tuple
+import ctranslate2
+from faster_whisper import BatchedInferencePipeline, WhisperModel, decode_audio
 
 from dotenv import load_dotenv
-from azure_cosmosdb import CosmosDBUploader
-from azure_uploader_stgacc import AzureBlobUploader
-from azure_blob_loader import download_blobs
-
-
-MAGIC_WORD_ROOTS = {
-    "obrigado": 0,
-    "por favor": 0,
-    "desculpa": 0,
-    "boa": 0,
-    "agradeço": 0,
-    "gratidão": 0,
-    "sinto muito": 0,
-    "perdão": 0,
-    "com licença": 0,
-}
+from audio_io import AudioDecoder, DecodedAudio, find_audio_files
+from claims import claimed, in_shard, open_claims, parse_shard
+from model_registry import resolve_model
+from pipeline import run_pipeline
+from run_manifest import RunManifest, run_stage
+from scheduler import DEFAULT_RTF, Schedule, load_priorities
+from transcription_cache import TranscriptionCache
+from magic_words import DEFAULT_LEXICON, MagicWordMatcher, load_matcher
+from analysis import analyze_transcription, timing_metrics
+from telemetry import telemetry
+from transcript_io import (
+    FORMATS,
+    STREAMING_FORMATS,
+    TranscriptWriter,
+    check_format,
+    write_transcript,
+)
+from vad import (
+    SAMPLING_RATE,
+    audio_channels,
+    channel_speech,
+    overlap_stats,
+    speech_timing,
+    talk_over,
+    union_seconds,
+    vad_parameters as build_vad_parameters,
+)
+
+
+# Diretório dos resultados de transcrição.
+JSON_PATH = "./json_files"
 
-MAGIC_WORD_PATTERNS = {
-    root: re.compile(rf"\b{root}(a|o|as|os)?s?\b") for root in MAGIC_WORD_ROOTS
+# Subcomandos: `python recogni.py <comando> ...` delega para o `main` do módulo.
+COMMANDS = {
+    "reanalyze": "reanalyze",
+    "aggregate": "aggregation",
+    "benchmark": "benchmark",
+    "serve": "server",
+    "models": "model_registry",
 }
 
 def setup_logging(log_directory: str, log_filename:str) -> None:
@@ -49,99 +72,576 @@ def setup_logging(log_directory: str, log_filename:str) -> None:
     #)
     #logging.getLogger().addHandler(console_handler)
 
+def transcription_from_segments(
+    segments, on_segment: Callable[[dict], None] = None, speaker: str = None
+) -> list:
+    """Consome os segmentos do Whisper (é aqui que a decodificação acontece).
+
+    `on_segment` recebe cada segmento assim que é decodificado (por exemplo,
+    `TranscriptWriter.write_segment`, para gravá-lo em disco na hora). Com
+    `word_timestamps`, os tempos de cada palavra entram em `words`.
+    """
+    transcription = []
+    for id, segment in enumerate(segments):
+        item = {
+            "order": id,
+            "start": segment.start,
+            "end": segment.end,
+            "transcription": segment.text,
+        }
+        if speaker is not None:
+            item["speaker"] = speaker
+        if segment.words:
+            item["words"] = [
+                {"start": word.start, "end": word.end, "word": word.word} for word in segment.words
+            ]
+        transcription.append(item)
+        if on_segment is not None:
+            on_segment(item)
+    return transcription
+
+
+def transcribe_channels(
+    model: WhisperModel, audio_path: str, agent_channel: int, stereo: tuple = None, **options
+) -> tuple:
+    """Transcreve os dois canais de uma gravação estéreo em paralelo, um falante por canal.
+
+    Cada canal é decodificado em uma thread (o CTranslate2 libera o GIL; com
+    `num_workers` >= 2 no modelo as duas decodificações rodam de fato ao mesmo
+    tempo). Os segmentos dos dois lados são intercalados por tempo de início.
+    `stereo` são os canais já decodificados, se disponíveis.
+    Retorna a transcrição e o `TranscriptionInfo` de cada canal.
+    """
+    channels = stereo or decode_audio(str(audio_path), sampling_rate=SAMPLING_RATE, split_stereo=True)
+    speakers = {agent_channel: "agent", 1 - agent_channel: "customer"}
+
+    def transcribe_channel(channel: int) -> tuple:
+        segments, info = model.transcribe(audio=channels[channel], word_timestamps=True, **options)
+        return transcription_from_segments(segments, speaker=speakers[channel]), info
+
+    with ThreadPoolExecutor(max_workers=2, thread_name_prefix="channel") as executor:
+        results = list(executor.map(transcribe_channel, (0, 1)))
+
+    transcription = sorted(
+        results[0][0] + results[1][0], key=lambda segment: (segment["start"], segment["speaker"])
+    )
+    for order, segment in enumerate(transcription):
+        segment["order"] = order
+    return transcription, [info for _, info in results]
+
+
 def transcribe_and_analyze(
-    audio_path: str, prompt: str, model: WhisperModel, beam_size: int
+    audio_path: str,
+    prompt: str,
+    model: WhisperModel,
+    beam_size: int,
+    batch_size: int = 0,
+    matcher: MagicWordMatcher = None,
+    vad_parameters: dict = None,
+    output_format: str = "json",
+    on_segment: Callable[[dict], None] = None,
+    agent_channel: int = None,
+    audio: DecodedAudio = None,
 ) -> Tuple[str, dict]:
-    """Transcreve um arquivo de áudio e analisa a transcrição."""
+    """Transcreve um arquivo de áudio e analisa a transcrição.
+
+    Com `batch_size` > 0, `model` deve ser um `BatchedInferencePipeline`.
+    As "palavras mágicas" são contadas com `matcher` (léxico padrão se None).
+    Com `vad_parameters`, os trechos sem fala são descartados antes da
+    decodificação e as métricas de tempo de fala entram no bloco `metrics`.
+    `on_segment` recebe cada segmento assim que é decodificado.
+    Com `agent_channel` (0 ou 1), gravações estéreo são separadas por canal
+    (atendente e cliente), com tempos por palavra e métricas por falante.
+    `audio` é o áudio já decodificado por um `AudioDecoder`; sem ele, o
+    arquivo é decodificado aqui.
+    """
     try:
-        segments, _ = model.transcribe(
-            audio=audio_path, language="pt", beam_size=beam_size, initial_prompt=prompt
-        )        
-        transcription_data_optimized = {
-            "prompt": prompt,
-            "audio_path": str(audio_path),
-            "transcription": [],
-            "metrics": {
-                "total_words": 0,
-                "words_per_minute": 0,
-                "top_10_words": [],
-                "magic_word_percentages": {},  # Inicializa vazio
-            },
-        }
-        
-        audio_paths.append(str(audio_path))
-        
-        total_words = 0
-        word_count = Counter()
-        total_duration = 0
-        
-        for root in MAGIC_WORD_ROOTS:
-            MAGIC_WORD_ROOTS[root] = 0
-        
-        # Otimizando o loop de processamento de segmentos
-        for id, segment in enumerate(segments):
-            segment_text_lower = segment.text.lower()
-            words = segment_text_lower.split()
-            total_words += len(words)
-            word_count.update(words)
-            total_duration += segment.end - segment.start
-            
-            transcription_data_optimized["transcription"].append(
-                {
-                    "order": id,
-                    "start": segment.start,
-                    "end": segment.end,
-                    "transcription": segment.text,
-                }
-            )
-            
-            # Buscar "magic words" usando regex
-            for root, pattern in MAGIC_WORD_PATTERNS.items():
-                matches = pattern.findall(segment_text_lower)
-                MAGIC_WORD_ROOTS[root] += len(matches)
-
-        if total_duration > 0 and total_words > 0:
-            transcription_data_optimized["metrics"].update(
-                {
-                    "total_words": total_words,
-                    "words_per_minute": (total_words / total_duration) * 60,
-                    "top_10_words": word_count.most_common(10),
-                    # Calcula a porcentagem aqui
-                    "magic_word_percentages": {
-                        root: (count / total_words) * 100
-                        for root, count in MAGIC_WORD_ROOTS.items()
-                    },
-                }
-            )
+        options = {"batch_size": batch_size} if batch_size > 0 else {}
+        if vad_parameters is not None:
+            options.update({"vad_filter": True, "vad_parameters": vad_parameters})
+        start = time.perf_counter()
+        options.update({"language": "pt", "beam_size": beam_size, "initial_prompt": prompt})
+        channels = audio.channels if audio is not None else audio_channels(audio_path)
+        stereo = audio.stereo if audio is not None else None
+        split = agent_channel is not None and channels >= 2
+        with telemetry.stage("transcribe", audio_path=str(audio_path)):
+            if split:
+                transcription, infos = transcribe_channels(
+                    model, audio_path, agent_channel, stereo, **options
+                )
+                info = infos[0]
+                # A ordem final só é conhecida depois dos dois canais.
+                for segment in transcription:
+                    if on_segment is not None:
+                        on_segment(segment)
+            else:
+                if agent_channel is not None:
+                    logging.info(f"{audio_path} é mono; falantes não serão separados")
+                    options["word_timestamps"] = True
+                samples = audio.mono if audio is not None else None
+                segments, info = model.transcribe(
+                    audio=samples if samples is not None else audio_path, **options
+                )
+                transcription = transcription_from_segments(segments, on_segment)
+        decode_seconds = time.perf_counter() - start
 
-        json_filename = os.path.basename(os.path.splitext(audio_path)[0]) + ".json"
-        return json_filename, transcription_data_optimized
+        with telemetry.stage("analysis", audio_path=str(audio_path)):
+            timing = None
+            if vad_parameters is not None and split:
+                # Silêncio é quando nenhum dos lados fala: o tempo de fala é a
+                # união dos intervalos dos dois canais, não a soma.
+                intervals = channel_speech(audio_path, vad_parameters, stereo)
+                if intervals:
+                    speech_seconds = union_seconds(*intervals)
+                else:
+                    speech_seconds = max(item.duration_after_vad for item in infos)
+                timing = speech_timing(
+                    SimpleNamespace(
+                        duration=info.duration,
+                        duration_after_vad=min(speech_seconds, info.duration),
+                    )
+                )
+                timing.update(overlap_stats(*intervals) if intervals else {})
+            elif vad_parameters is not None:
+                timing = speech_timing(info)
+                timing.update(talk_over(audio_path, vad_parameters, stereo) or {})
+            transcription_data_optimized = {
+                "prompt": prompt,
+                "audio_path": str(audio_path),
+                # Preservada pelo reanalyze; usada pelo aggregate quando o
+                # nome do áudio não traz a data da ligação.
+                "execution_date": datetime.now().isoformat(),
+                "transcription": transcription,
+                "metrics": analyze_transcription(transcription, matcher, timing),
+            }
+
+        telemetry.inc("recogni_files_total", status="ok")
+        telemetry.inc("recogni_audio_seconds_total", info.duration)
+        telemetry.event(
+            "file",
+            audio_path=str(audio_path),
+            audio_seconds=info.duration,
+            decode_seconds=decode_seconds,
+            rtf=decode_seconds / info.duration if info.duration else None,
+        )
+        return json_filename(audio_path, output_format), transcription_data_optimized
 
     except Exception as e:
+        telemetry.inc("recogni_files_total", status="error")
         logging.error(f"Erro ao processar arquivo {audio_path}: {e}")
         return None, None
 
 
-def save_json(filename: str, data: dict) -> None:
-    """Salva os dados em um arquivo JSON."""
-    json_path = "./json_files"
-    os.makedirs(json_path, exist_ok=True)
-    json_file = os.path.join(json_path, filename)
+def json_filename(audio_path: str, output_format: str = "json") -> str:
+    """Nome do arquivo de resultado para um arquivo de áudio (extensão do formato)."""
+    return os.path.basename(os.path.splitext(audio_path)[0]) + FORMATS[output_format]
+
+
+def save_json(filename: str, data: dict) -> str:
+    """Salva os dados no formato da extensão de `filename` e retorna o caminho salvo."""
+    os.makedirs(JSON_PATH, exist_ok=True)
+    json_file = os.path.join(JSON_PATH, filename)
 
     try:
-        with open(json_file, "w", encoding="utf-8") as f:
-            ujson.dump(data, f, ensure_ascii=False, indent=4)
-        json_paths.append(json_file)
+        with telemetry.stage("save_json", json_file=json_file):
+            write_transcript(json_file, data)
         logging.info(f"Transcrição e métricas salvas com sucesso em {json_file}")
+        return json_file
     except IOError as e:
         logging.error(f"Falha ao salvar arquivo JSON: {e}")
+        return None
+
+
+def process_file_result(
+    audio_file: str,
+    prompt: str,
+    model: WhisperModel,
+    beam_size: int,
+    batch_size: int = 0,
+    cache: TranscriptionCache = None,
+    refresh: bool = False,
+    matcher: MagicWordMatcher = None,
+    vad_parameters: dict = None,
+    output_format: str = "json",
+    agent_channel: int = None,
+    audio: DecodedAudio = None,
+) -> Optional[Tuple[str, dict]]:
+    """Processa um único arquivo de áudio e retorna o caminho salvo e o resultado.
+
+    Com `cache`, um resultado já armazenado para o mesmo áudio e parâmetros é
+    reaproveitado sem transcrever; `refresh` força a transcrição e atualiza o cache.
+    Nos formatos JSON Lines, cada segmento é gravado assim que é decodificado.
+    `audio` é o áudio já decodificado (ver `AudioDecoder`). Retorna None em
+    caso de falha.
+    """
+    if cache is not None:
+        key, data = cache.lookup(audio_file, prompt, refresh)
+        if data is not None:
+            # O léxico pode ter mudado desde que o resultado foi armazenado.
+            data["metrics"] = analyze_transcription(
+                data["transcription"], matcher, timing_metrics(data["metrics"])
+            )
+            json_file = save_json(json_filename(audio_file, output_format), data)
+            return (json_file, data) if json_file else None
+
+    writer = None
+    if output_format in STREAMING_FORMATS:
+        writer = TranscriptWriter(
+            os.path.join(JSON_PATH, json_filename(audio_file, output_format)),
+            prompt=prompt,
+            audio_path=str(audio_file),
+        )
+    filename, data = transcribe_and_analyze(
+        audio_file, prompt, model, beam_size, batch_size, matcher, vad_parameters,
+        output_format, writer.write_segment if writer is not None else None, agent_channel,
+        audio,
+    )
+    if not (filename and data):
+        if writer is not None:
+            writer.abort()
+        return None
+    if cache is not None:
+        cache.put(key, data)
+    if writer is None:
+        json_file = save_json(filename, data)
+        return (json_file, data) if json_file else None
+    with telemetry.stage("save_json", json_file=writer.path):
+        json_file = writer.close(data)
+    logging.info(f"Transcrição e métricas salvas com sucesso em {json_file}")
+    return json_file, data
+
+
+def process_file(*args, **kwargs) -> str:
+    """Processa um único arquivo de áudio e retorna o caminho salvo (ver `process_file_result`)."""
+    result = process_file_result(*args, **kwargs)
+    return result[0] if result else None
+
+
+def load_model(
+    model_size: str,
+    device: str,
+    compute_type: str,
+    cpu_threads: int = 0,
+    batched: bool = False,
+    num_workers: int = 1,
+) -> WhisperModel:
+    """Carrega o modelo Whisper com o número de threads de CPU informado.
+
+    Com `batched`, o modelo é envolvido no `BatchedInferencePipeline`, que
+    divide o áudio por VAD e decodifica os trechos em lotes. `num_workers`
+    réplicas permitem chamar `transcribe` de várias threads em paralelo.
+    `model_size` também pode ser o diretório de um modelo (ver `resolve_model`).
+    """
+    with telemetry.stage("model_load", model_size=model_size, compute_type=compute_type):
+        model = WhisperModel(
+            model_size,
+            device=device,
+            compute_type=compute_type,
+            cpu_threads=cpu_threads,
+            num_workers=num_workers,
+        )
+    if batched:
+        return BatchedInferencePipeline(model=model)
+    return model
+
+
+def resolve_device(device: str) -> str:
+    """Troca `cuda` por `cpu` quando o CTranslate2 não encontra GPU."""
+    if device == "cuda" and ctranslate2.get_cuda_device_count() == 0:
+        logging.warning(
+            "GPU não encontrada, utilizando CPU. Para usar a GPU, certifique-se de que o CUDA esteja configurado corretamente."
+        )
+        return "cpu"
+    return device
+
+
+# Modelo e léxico carregados uma única vez por processo do pool (ver _init_worker).
+_worker_model = None
+_worker_matcher = None
+
+
+def _init_worker(
+    model_size: str,
+    device: str,
+    compute_type: str,
+    cpu_threads: int,
+    batched: bool,
+    log_filename: str,
+    lexicon: str = DEFAULT_LEXICON,
+    trace_file: str = None,
+    num_workers: int = 1,
+) -> None:
+    """Inicializa um processo do pool: configura o log e carrega o modelo."""
+    global _worker_model, _worker_matcher
+    setup_logging(os.path.dirname(log_filename), log_filename)
+    telemetry.configure(trace_file=trace_file)
+    _worker_model = load_model(
+        model_size, device, compute_type, cpu_threads, batched, num_workers
+    )
+    _worker_matcher = load_matcher(lexicon)
+    logging.info(f"Worker {os.getpid()} pronto com {cpu_threads} threads de CPU")
+
+
+def _transcribe_in_worker(
+    audio_file: str,
+    prompt: str,
+    beam_size: int,
+    batch_size: int,
+    vad_parameters: dict,
+    agent_channel: int = None,
+) -> Tuple[Tuple[str, dict], dict]:
+    """Transcreve um arquivo usando o modelo do processo atual do pool.
+
+    Retorna também as métricas acumuladas no worker desde a última tarefa,
+    que o processo principal soma às suas com `telemetry.merge`.
+    """
+    result = transcribe_and_analyze(
+        audio_file,
+        prompt,
+        _worker_model,
+        beam_size,
+        batch_size,
+        _worker_matcher,
+        vad_parameters,
+        agent_channel=agent_channel,
+    )
+    return result, telemetry.snapshot(reset=True)
+
+
+def channel_workers(agent_channel: int = None) -> int:
+    """Réplicas do modelo necessárias: uma por canal quando os falantes são separados."""
+    return 1 if agent_channel is None else 2
+
+
+def worker_cpu_threads(workers: int, cpu_threads: int = 0) -> int:
+    """Divide os núcleos disponíveis entre os workers, se não informado."""
+    if cpu_threads > 0:
+        return cpu_threads
+    return max(1, (os.cpu_count() or 1) // workers)
+
+
+def process_files_parallel(
+    audio_files: list,
+    prompt: str,
+    beam_size: int,
+    workers: int,
+    model_size: str,
+    device: str,
+    compute_type: str,
+    cpu_threads: int,
+    log_filename: str,
+    batch_size: int = 0,
+    cache: TranscriptionCache = None,
+    refresh: bool = False,
+    lexicon: str = DEFAULT_LEXICON,
+    vad_parameters: dict = None,
+    on_result: Callable[[str, Optional[str]], None] = None,
+    output_format: str = "json",
+    agent_channel: int = None,
+) -> None:
+    """Processa vários arquivos em um pool de processos, um modelo por worker.
+
+    Os arquivos são distribuídos pela fila compartilhada do pool e os resultados
+    são salvos no processo principal na ordem em que ficam prontos. Acertos do
+    cache são salvos direto, sem passar pelo pool. `on_result` é chamado com o
+    áudio e o JSON salvo (None em caso de falha) assim que cada arquivo termina.
+    """
+    on_result = on_result or (lambda audio_file, json_file: None)
+    keys = {}
+    if cache is not None:
+        matcher = load_matcher(lexicon)
+        pending = []
+        for audio_file in audio_files:
+            key, data = cache.lookup(audio_file, prompt, refresh)
+            if data is not None:
+                data["metrics"] = analyze_transcription(
+                    data["transcription"], matcher, timing_metrics(data["metrics"])
+                )
+                on_result(str(audio_file), save_json(json_filename(audio_file, output_format), data))
+            else:
+                keys[str(audio_file)] = key
+                pending.append(audio_file)
+        audio_files = pending
+    if not audio_files:
+        return
+
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=context,
+        initializer=_init_worker,
+        initargs=(
+            model_size,
+            device,
+            compute_type,
+            cpu_threads,
+            batch_size > 0,
+            log_filename,
+            lexicon,
+            telemetry.trace_file,
+            channel_workers(agent_channel),
+        ),
+    ) as executor:
+        futures = {
+            executor.submit(
+                _transcribe_in_worker,
+                str(audio_file),
+                prompt,
+                beam_size,
+                batch_size,
+                vad_parameters,
+                agent_channel,
+            ): audio_file
+            for audio_file in audio_files
+        }
+        remaining = len(futures)
+        telemetry.set_gauge("recogni_queue_depth", remaining, queue="workers")
+        for future in as_completed(futures):
+            remaining -= 1
+            telemetry.set_gauge("recogni_queue_depth", remaining, queue="workers")
+            try:
+                (filename, data), snapshot = future.result()
+            except Exception as e:
+                logging.error(f"Erro no worker ao processar {futures[future]}: {e}")
+                telemetry.inc("recogni_files_total", status="error")
+                on_result(str(futures[future]), None)
+                continue
+            telemetry.merge(snapshot)
+            if filename and data:
+                if cache is not None:
+                    cache.put(keys[data["audio_path"]], data)
+                on_result(
+                    data["audio_path"],
+                    save_json(json_filename(data["audio_path"], output_format), data),
+                )
+            else:
+                on_result(str(futures[future]), None)
+
+
+def upload_sinks(model_name: str) -> list:
+    """Cria os uploads por arquivo (Cosmos DB, JSON e áudio) do modo --pipeline.
+
+    Cada função recebe o áudio e o resultado de `process_file_result`.
+    """
+    from azure_cosmosdb import CosmosDBUploader
+    from azure_uploader_stgacc import AzureBlobUploader
+
+    cosmos_uploader = CosmosDBUploader(
+        os.environ["COSMOS_ENDPOINT"],
+        os.environ["COSMOS_KEY"],
+        "transcriptions-db",
+        "container-result-transcription",
+        model_name=model_name,
+    )
+    json_uploader = AzureBlobUploader(
+        os.environ['STORAGE_ACCOUNT_KEY'],
+        os.environ['CONTAINER_JSON']
+    )
+    audio_uploader = AzureBlobUploader(
+        os.environ['STORAGE_ACCOUNT_KEY'],
+        os.environ['CONTAINER_AUDIOS']
+    )
+
+    def checked(upload, destination):
+        # Os uploaders registram o erro e retornam False; levantar aqui faz o
+        # pipeline liberar a reivindicação em vez de concluir o arquivo.
+        def sink(audio_file, result):
+            if not upload(audio_file, result):
+                raise RuntimeError(f"Falha ao enviar {audio_file} ao {destination}")
+        return sink
+
+    # Cada resultado é (caminho salvo, dados); o Cosmos DB recebe os dados em
+    # memória, sem ler o arquivo de volta.
+    return [
+        checked(
+            lambda audio_file, result: cosmos_uploader.upload_data(result[1], result[0]),
+            "Cosmos DB",
+        ),
+        checked(
+            lambda audio_file, result: json_uploader.upload_file(result[0], overwrite=True),
+            "contêiner de JSON",
+        ),
+        checked(
+            lambda audio_file, result: audio_uploader.upload_file(audio_file, overwrite=True),
+            "contêiner de áudios",
+        ),
+    ]
 
 
-def process_file(audio_file: str, prompt: str, model: WhisperModel, beam_size: int) -> None:
-    """Processa um único arquivo de áudio."""
-    filename, data = transcribe_and_analyze(audio_file, prompt, model, beam_size)
-    if filename and data:
-        save_json(filename, data)
+def complete_file(
+    audio_file: str, ok: bool, claims=None, name: str = None, downloads=None
+) -> None:
+    """Finaliza um arquivo que saiu do pipeline.
+
+    Conclui a reivindicação só se a transcrição e todos os uploads deram certo;
+    se algo falhou, libera-a para outro nó tentar de novo. Com `downloads` (o
+    `BlobManifest` de `--delete_audio`), apaga o áudio baixado já enviado e o
+    marca no manifesto, mantendo o disco limitado aos arquivos em trânsito.
+    """
+    if claims is not None:
+        if ok:
+            claims.done(name)
+        else:
+            claims.release(name)
+    if ok and downloads is not None:
+        os.remove(audio_file)
+        downloads.discard(audio_file)
+
+
+def report_schedule(schedule: Schedule) -> None:
+    """Registra o tempo estimado e o real de um lote agendado."""
+    report = schedule.report()
+    telemetry.event("schedule", **report)
+    message = (
+        f"Lote de {report['files']} arquivos: estimado {report['estimated_seconds'] / 60:.1f} min, "
+        f"real {report['actual_seconds'] / 60:.1f} min (RTF observado {report['observed_rtf'] or 0:.3f})"
+    )
+    logging.info(message)
+    print(message)
+
+
+def upload_results(manifest: RunManifest, audio_files: list, model_name: str) -> None:
+    """Envia os resultados salvos ao Cosmos DB ("indexed") e ao Blob Storage ("uploaded").
+
+    Só os arquivos que ainda não concluíram cada etapa são enviados, e cada
+    resultado é marcado no manifesto, então uma execução retomada não reenvia
+    o que já foi gravado.
+    """
+    from azure_cosmosdb import CosmosDBUploader
+    from azure_uploader_stgacc import AzureBlobUploader
+
+    def index(pending):
+        report = CosmosDBUploader(
+            os.environ["COSMOS_ENDPOINT"],
+            os.environ["COSMOS_KEY"],
+            "transcriptions-db",
+            "container-result-transcription",
+            model_name=model_name,
+        ).upload_files(paths=[json_file for _, json_file in pending])
+        failed = set(report["failed"])
+        for audio_file, json_file in pending:
+            if json_file in failed:
+                manifest.fail(audio_file, "falha ao gravar no Cosmos DB")
+            else:
+                manifest.mark(audio_file, "indexed")
+
+    def upload(pending):
+        json_results = AzureBlobUploader(
+            os.environ['STORAGE_ACCOUNT_KEY'],
+            os.environ['CONTAINER_JSON']
+        ).upload_files([json_file for _, json_file in pending], overwrite=True)
+        audio_results = AzureBlobUploader(
+            os.environ['STORAGE_ACCOUNT_KEY'],
+            os.environ['CONTAINER_AUDIOS']
+        ).upload_files([audio_file for audio_file, _ in pending], overwrite=True)
+        for audio_file, json_file in pending:
+            if json_results.get(json_file) and audio_results.get(audio_file):
+                manifest.mark(audio_file, "uploaded")
+            else:
+                manifest.fail(audio_file, "falha ao enviar ao Blob Storage")
+
+    run_stage(manifest, "indexed", index, audio_files)
+    run_stage(manifest, "uploaded", upload, audio_files)
 
 if __name__ == "__main__":
     log_directory = './logs'
@@ -151,9 +651,10 @@ if __name__ == "__main__":
     
     env_path = ".env"
     load_dotenv(env_path)
-    
-    json_paths = []
-    audio_paths = []
+
+    if len(sys.argv) > 1 and sys.argv[1] in COMMANDS:
+        importlib.import_module(COMMANDS[sys.argv[1]]).main(sys.argv[2:])
+        sys.exit(0)
 
     parser = argparse.ArgumentParser()
     parser.add_argument(
@@ -168,6 +669,19 @@ if __name__ == "__main__":
     parser.add_argument(
         "--model_size", default="large-v3", help="Tamanho do modelo Whisper"
     )
+    parser.add_argument(
+        "--model_dir",
+        default=None,
+        help=(
+            "Registro local de modelos (padrão: $MODEL_DIR; ver 'recogni.py models prefetch');"
+            " carrega sem acessar a rede"
+        ),
+    )
+    parser.add_argument(
+        "--verify_model",
+        action="store_true",
+        help="Confere os SHA-256 do modelo do registro antes de carregá-lo",
+    )
     parser.add_argument(
         "--beam_size", default=5, help="Tamanho do beam"
     )
@@ -181,73 +695,458 @@ if __name__ == "__main__":
         default="int8_float16",
         help="Tipo de computação para a transcrição (float16 ou int8_float16)",
     )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Número de processos para transcrever um diretório em paralelo",
+    )
+    parser.add_argument(
+        "--cpu_threads",
+        type=int,
+        default=0,
+        help="Threads de CPU por modelo (0 divide os núcleos entre os workers)",
+    )
+    parser.add_argument(
+        "--batched",
+        action="store_true",
+        help="Usa o BatchedInferencePipeline (trechos por VAD decodificados em lote)",
+    )
+    parser.add_argument(
+        "--batch_size",
+        type=int,
+        default=16,
+        help="Tamanho do lote no modo --batched",
+    )
+    parser.add_argument(
+        "--pipeline",
+        action="store_true",
+        help="Sobrepõe download, transcrição e upload, enviando cada resultado assim que fica pronto",
+    )
+    parser.add_argument(
+        "--prefetch",
+        type=int,
+        default=4,
+        help="Máximo de áudios baixados aguardando transcrição no modo --pipeline",
+    )
+    parser.add_argument(
+        "--delete_audio",
+        action="store_true",
+        help="No modo --pipeline, apaga cada áudio baixado assim que seus uploads terminam "
+        "(o manifesto evita baixá-lo de novo)",
+    )
+    parser.add_argument(
+        "--upload_queue_size",
+        type=int,
+        default=8,
+        help="Máximo de resultados aguardando upload no modo --pipeline",
+    )
+    parser.add_argument(
+        "--upload_workers",
+        type=int,
+        default=2,
+        help="Threads de upload no modo --pipeline",
+    )
+    parser.add_argument(
+        "--download_concurrency",
+        type=int,
+        default=4,
+        help="Número de blobs de áudio baixados ao mesmo tempo",
+    )
+    parser.add_argument(
+        "--blob_max_concurrency",
+        type=int,
+        default=2,
+        help="Conexões paralelas por blob durante o download",
+    )
+    parser.add_argument(
+        "--cache_path",
+        default="./cache/transcriptions.sqlite",
+        help="Arquivo SQLite do cache de transcrições",
+    )
+    parser.add_argument(
+        "--cache_max_mb",
+        type=float,
+        default=1024,
+        help="Tamanho máximo do cache de transcrições em MB (LRU)",
+    )
+    parser.add_argument(
+        "--no-cache",
+        dest="no_cache",
+        action="store_true",
+        help="Desativa o cache de transcrições",
+    )
+    parser.add_argument(
+        "--refresh",
+        action="store_true",
+        help="Ignora resultados em cache, transcreve novamente e atualiza o cache",
+    )
+    parser.add_argument(
+        "--lexicon",
+        default=DEFAULT_LEXICON,
+        help="Arquivo com o léxico de palavras mágicas (categoria: variante, ...)",
+    )
+    parser.add_argument(
+        "--vad",
+        action="store_true",
+        help="Remove silêncio e música de espera antes da decodificação (Silero VAD)",
+    )
+    parser.add_argument(
+        "--vad_threshold",
+        type=float,
+        default=0.5,
+        help="Probabilidade mínima de fala para o VAD",
+    )
+    parser.add_argument(
+        "--vad_min_silence_ms",
+        type=int,
+        default=2000,
+        help="Silêncio mínimo (ms) para separar trechos de fala",
+    )
+    parser.add_argument(
+        "--vad_speech_pad_ms",
+        type=int,
+        default=400,
+        help="Margem (ms) mantida em volta de cada trecho de fala",
+    )
+    parser.add_argument(
+        "--vad_min_speech_ms",
+        type=int,
+        default=250,
+        help="Duração mínima (ms) de um trecho de fala",
+    )
+    parser.add_argument(
+        "--speakers",
+        action="store_true",
+        help="Separa atendente e cliente (um por canal em gravações estéreo), com tempos "
+        "por palavra e métricas por falante",
+    )
+    parser.add_argument(
+        "--agent_channel",
+        type=int,
+        choices=(0, 1),
+        default=0,
+        help="Canal do atendente com --speakers (0 = esquerdo, 1 = direito)",
+    )
+    parser.add_argument(
+        "--output_format",
+        choices=sorted(FORMATS),
+        default="json",
+        help="Formato do resultado: json indentado, JSON Lines gravado a cada segmento, "
+        "versões gzip ou msgpack (requer o pacote msgpack)",
+    )
+    parser.add_argument(
+        "--estimated_rtf",
+        type=float,
+        default=DEFAULT_RTF,
+        help="Segundos de processamento por segundo de áudio, usado na estimativa de término "
+        "(use o RTF observado de execuções anteriores)",
+    )
+    parser.add_argument(
+        "--shard",
+        type=parse_shard,
+        help="Processa apenas o shard I de N (I/N, hashing consistente pelo nome do arquivo)",
+    )
+    parser.add_argument(
+        "--claims",
+        choices=("file", "blob"),
+        help="Com --pipeline, divide os arquivos entre processos/nós por reivindicação: "
+        "'file' (travas em um diretório local) ou 'blob' (leases no Blob Storage)",
+    )
+    parser.add_argument(
+        "--claims_path",
+        help="Diretório das travas (file, padrão ./claims) ou contêiner dos leases "
+        "(blob, padrão $CONTAINER_CLAIMS ou recogni-claims)",
+    )
+    parser.add_argument(
+        "--lease_seconds",
+        type=int,
+        default=60,
+        help="Duração dos leases (15 a 60 s): prazo para outro nó assumir os arquivos de um nó que caiu",
+    )
+    parser.add_argument(
+        "--decode_ahead",
+        type=int,
+        default=2,
+        help="Áudios decodificados e reamostrados em segundo plano à frente do modelo (0 desativa)",
+    )
+    parser.add_argument(
+        "--decode_threads", type=int, default=2, help="Threads de decodificação de áudio"
+    )
+    parser.add_argument(
+        "--no-upload",
+        dest="no_upload",
+        action="store_true",
+        help="Execução local: não envia resultados ao Cosmos DB/Blob Storage (nem carrega o SDK do Azure)",
+    )
+    parser.add_argument(
+        "--manifest_path",
+        default="./cache/run_manifest.sqlite",
+        help="Manifesto SQLite com a etapa de cada arquivo, usado para retomar execuções",
+    )
+    parser.add_argument(
+        "--no-manifest",
+        dest="no_manifest",
+        action="store_true",
+        help="Não persiste o progresso (toda execução recomeça do zero)",
+    )
+    parser.add_argument(
+        "--max_attempts",
+        type=int,
+        default=3,
+        help="Tentativas por etapa antes de desistir de um arquivo",
+    )
+    parser.add_argument(
+        "--retry_failed",
+        action="store_true",
+        help="Tenta de novo os arquivos que esgotaram as tentativas em execuções anteriores",
+    )
+    parser.add_argument(
+        "--metrics_port",
+        type=int,
+        help="Expõe as métricas no formato Prometheus em http://127.0.0.1:<porta>/metrics",
+    )
+    parser.add_argument(
+        "--trace_file",
+        help="Arquivo JSON Lines com um evento por estágio e por arquivo processado",
+    )
     args = parser.parse_args()
+    if args.claims and not args.pipeline:
+        parser.error("--claims requer --pipeline (os arquivos são reivindicados à medida que são processados)")
+    telemetry.configure(args.trace_file, args.metrics_port)
+    check_format(args.output_format)
+    model_path = resolve_model(args.model_size, args.model_dir, args.verify_model)
 
     # Verifica se o caminho do áudio foi fornecido e se o caminho é válido
-    if not args.audio_path or not Path(args.audio_path).exists():
+    audio_path = None
+    if args.audio_path and Path(args.audio_path).exists():
+        audio_path = Path(args.audio_path)
+    elif not args.pipeline:
         print("Caminho de áudio não fornecido ou inválido, iniciando download...")
+        from azure_blob_loader import download_blobs
+
         audio_path = download_blobs(
             os.environ['STORAGE_ACCOUNT_KEY'], 
             os.environ['CONTAINER_AUDIOS'], 
-            download_path='audio_samples'
+            download_path='audio_samples',
+            concurrency=args.download_concurrency,
+            max_concurrency=args.blob_max_concurrency,
+            shard=args.shard,
         )
-    else:
-        audio_path = Path(args.audio_path)
 
     # Verifica se a GPU está disponível
-    if args.device == "cuda" and not cuda.is_available():
-        logging.warning(
-            "GPU não encontrada, utilizando CPU. Para usar a GPU, certifique-se de que o PyTorch esteja configurado corretamente."
-        )
-        args.device = "cpu"
+    args.device = resolve_device(args.device)
 
-    model = WhisperModel(
-        args.model_size, device=args.device, compute_type=args.compute_type
+    cpu_threads = worker_cpu_threads(args.workers, args.cpu_threads)
+    batch_size = args.batch_size if args.batched else 0
+    parallel = (
+        args.workers > 1 and not args.pipeline and audio_path is not None and audio_path.is_dir()
     )
-    
+    matcher = load_matcher(args.lexicon)
+    vad_parameters = None
+    if args.vad:
+        vad_parameters = build_vad_parameters(
+            args.vad_threshold,
+            args.vad_min_silence_ms,
+            args.vad_speech_pad_ms,
+            args.vad_min_speech_ms,
+        )
+    agent_channel = args.agent_channel if args.speakers else None
+    cache_params = {
+        "model_size": args.model_size,
+        "compute_type": args.compute_type,
+        "beam_size": int(args.beam_size),
+        "batch_size": batch_size,
+        "vad_parameters": vad_parameters,
+    }
+    if agent_channel is not None:
+        cache_params["agent_channel"] = agent_channel
+    cache = None
+    if not args.no_cache:
+        cache = TranscriptionCache(args.cache_path, args.cache_max_mb, cache_params)
+
+    model = None
+    if args.pipeline:
+        model = load_model(
+            model_path, args.device, args.compute_type, args.cpu_threads, args.batched,
+            channel_workers(agent_channel),
+        )
+
     try:
-        if audio_path.is_file():
-            process_file(audio_path, str(args.prompt), model, args.beam_size)
-        elif audio_path.is_dir():
-            audio_files = list(audio_path.glob("*.[wm][ap][v3a]"))
-            for audio_file in audio_files:
-                process_file(audio_file, str(args.prompt), model, args.beam_size)
+        if args.pipeline:
+            # Com --claims, vários processos/nós dividem os mesmos arquivos: cada
+            # um reivindica o arquivo ao buscá-lo e o conclui após os uploads.
+            claims = (
+                open_claims(args.claims, args.claims_path, args.lease_seconds) if args.claims else None
+            )
+            # Manifesto de downloads em que os áudios apagados são marcados
+            # (apenas com --delete_audio).
+            downloads = None
+            if audio_path is None:
+                print("Caminho de áudio não fornecido ou inválido, baixando em paralelo à transcrição...")
+                from azure_blob_loader import BlobManifest, iter_blobs
+
+                claim_root = 'audio_samples'
+                if args.delete_audio:
+                    downloads = BlobManifest(claim_root)
+                source = iter_blobs(
+                    os.environ['STORAGE_ACCOUNT_KEY'],
+                    os.environ['CONTAINER_AUDIOS'],
+                    download_path=claim_root,
+                    concurrency=args.download_concurrency,
+                    max_concurrency=args.blob_max_concurrency,
+                    claims=claims,
+                    shard=args.shard,
+                    manifest=downloads,
+                )
+            else:
+                claim_root = str(audio_path if audio_path.is_dir() else audio_path.parent)
+                source = claimed(
+                    find_audio_files(audio_path),
+                    claims,
+                    args.shard,
+                    lambda audio_file: os.path.relpath(audio_file, claim_root),
+                )
+            decoder = None
+            if args.decode_ahead > 0:
+                # A fila do pipeline (--prefetch) já mantém arquivos à frente do modelo.
+                decoder = AudioDecoder(
+                    args.decode_threads, agent_channel is not None, vad_parameters is not None
+                )
+                source = decoder.decode_ahead(source, ahead=0)
+            # No modo --pipeline cada resultado é enviado assim que fica pronto
+            try:
+                run_pipeline(
+                    source,
+                    lambda audio_file: process_file_result(
+                        audio_file, str(args.prompt), model, args.beam_size, batch_size,
+                        cache, args.refresh, matcher, vad_parameters, args.output_format,
+                        agent_channel, decoder.take(audio_file) if decoder is not None else None,
+                    ),
+                    [] if args.no_upload else upload_sinks(args.model_size),
+                    prefetch=args.prefetch,
+                    upload_queue_size=args.upload_queue_size,
+                    upload_workers=args.upload_workers,
+                    on_complete=lambda audio_file, ok: complete_file(
+                        audio_file, ok, claims, os.path.relpath(audio_file, claim_root), downloads
+                    ),
+                )
+            finally:
+                # Os últimos arquivos são concluídos depois que a listagem termina.
+                if downloads is not None:
+                    downloads.save()
+                if decoder is not None:
+                    decoder.close()
+                if claims is not None:
+                    claims.close()
+        elif audio_path.is_file() or audio_path.is_dir():
+            audio_root = str(audio_path if audio_path.is_dir() else audio_path.parent)
+            audio_files = [
+                audio_file
+                for audio_file in find_audio_files(audio_path)
+                if in_shard(os.path.relpath(audio_file, audio_root), args.shard)
+            ]
+            # Mudar o modelo, o prompt, o léxico ou o formato refaz os arquivos.
+            manifest = RunManifest(
+                ":memory:" if args.no_manifest else args.manifest_path,
+                args.max_attempts,
+                {
+                    **cache_params,
+                    "prompt": str(args.prompt),
+                    "lexicon": args.lexicon,
+                    "output_format": args.output_format,
+                },
+            )
+            manifest.add(audio_files)
+            if args.refresh:
+                manifest.reset(audio_files)
+            elif args.retry_failed:
+                manifest.retry(audio_files)
+
+            priorities = load_priorities(audio_path) if audio_path.is_dir() else {}
+
+            def transcribe(pending):
+                global model
+                schedule = Schedule(
+                    [audio_file for audio_file, _ in pending],
+                    args.workers if parallel else 1,
+                    priorities,
+                    args.estimated_rtf,
+                )
+                files = schedule.order
+                if parallel:
+                    schedule.start()
+                    process_files_parallel(
+                        files,
+                        str(args.prompt),
+                        args.beam_size,
+                        args.workers,
+                        model_path,
+                        args.device,
+                        args.compute_type,
+                        cpu_threads,
+                        log_filename,
+                        batch_size,
+                        cache,
+                        args.refresh,
+                        args.lexicon,
+                        vad_parameters,
+                        on_result=manifest.record,
+                        output_format=args.output_format,
+                        agent_channel=agent_channel,
+                    )
+                    report_schedule(schedule)
+                    return
+                # Carregado só se houver o que transcrever (uma execução retomada
+                # pode ter apenas uploads pendentes).
+                if model is None:
+                    model = load_model(
+                        model_path, args.device, args.compute_type, args.cpu_threads,
+                        args.batched, channel_workers(agent_channel),
+                    )
+                schedule.start()
+                decoder = None
+                if args.decode_ahead > 0:
+                    decoder = AudioDecoder(
+                        args.decode_threads, agent_channel is not None, vad_parameters is not None
+                    )
+                    files = decoder.decode_ahead(files, args.decode_ahead)
+                try:
+                    for audio_file in files:
+                        manifest.record(
+                            audio_file,
+                            process_file(
+                                audio_file, str(args.prompt), model, args.beam_size, batch_size,
+                                cache, args.refresh, matcher, vad_parameters, args.output_format,
+                                agent_channel,
+                                decoder.take(audio_file) if decoder is not None else None,
+                            ),
+                        )
+                finally:
+                    if decoder is not None:
+                        decoder.close()
+                report_schedule(schedule)
+
+            run_stage(manifest, "saved", transcribe, audio_files)
+            if not args.no_upload:
+                upload_results(manifest, audio_files, args.model_size)
+            summary = manifest.summary()
+            logging.info(f"Execução concluída: {summary}")
+            print(f"Execução concluída: {summary}")
+            manifest.close()
         else:
             logging.error(f"Erro: Não foi possivel carregar os arquivos json para o 'container-result-transcription'.")
-        
-        try:
-            cosmos_uploader = CosmosDBUploader(
-                os.environ["COSMOS_ENDPOINT"],
-                os.environ["COSMOS_KEY"],
-                "transcriptions-db",
-                "container-result-transcription"
-            ).upload_files(paths=json_paths)
-        except ValueError as err:
-            print(err.args)
-        
-        try:
-            blob_uploader = AzureBlobUploader(
-                os.environ['STORAGE_ACCOUNT_KEY'],
-                os.environ['CONTAINER_JSON']
-            ).upload_files(json_paths, overwrite=True)
-        except ValueError as err:
-            print(err.args)
-        
-        try:
-            blob_uploader = AzureBlobUploader(
-                os.environ['STORAGE_ACCOUNT_KEY'],
-                os.environ['CONTAINER_AUDIOS']
-            ).upload_files(audio_paths, overwrite=True)
-        except ValueError as err:
-            print(err.args)
-        
-        try:
-            blob_uploader = AzureBlobUploader(
-                os.environ['STORAGE_ACCOUNT_KEY'],
-                os.environ['CONTAINER_LOGS']
-            ).upload_file(log_filename, overwrite=True)
-        except ValueError as err:
-            print(err.args)
+
+        if not args.no_upload:
+            from azure_uploader_stgacc import AzureBlobUploader
+
+            try:
+                blob_uploader = AzureBlobUploader(
+                    os.environ['STORAGE_ACCOUNT_KEY'],
+                    os.environ['CONTAINER_LOGS']
+                ).upload_file(log_filename, overwrite=True)
+            except ValueError as err:
+                print(err.args)
 
     except ValueError as err:
             print(err.args)
\ No newline at end of file
@@ -0,0 +1,176 @@
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+import ujson
+
+from typing import Iterable, List, Optional
+
+
+# Etapas de cada arquivo, na ordem. "saved" cobre a transcrição e o JSON gravado
+# (um áudio transcrito mas não salvo volta do cache de transcrições).
+STAGES = ("downloaded", "saved", "indexed", "uploaded")
+
+
+class RunManifest:
+    """Manifesto persistente (SQLite) do progresso de uma execução por arquivo.
+
+    Cada áudio guarda a última etapa concluída (`STAGES`), o JSON gerado e as
+    tentativas falhas da etapa seguinte. Uma execução interrompida é retomada
+    da última etapa concluída de cada arquivo, e arquivos que falharam
+    `max_attempts` vezes na mesma etapa deixam de ser tentados. Cada linha guarda
+    também o hash dos parâmetros da execução (modelo, prompt, formato...): um
+    arquivo registrado com outros parâmetros recomeça do zero.
+    """
+
+    def __init__(self, db_path: str, max_attempts: int = 3, params: dict = None):
+        """Abre (ou cria) o manifesto.
+
+        Args:
+            db_path (str): Caminho do arquivo SQLite (":memory:" para não persistir).
+            max_attempts (int): Tentativas por etapa antes de desistir do arquivo.
+            params (dict): Parâmetros de decodificação e de saída da execução.
+        """
+        if db_path != ":memory:":
+            os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self.max_attempts = max(1, max_attempts)
+        self.params = hashlib.sha256(
+            ujson.dumps(params or {}, sort_keys=True).encode("utf-8")
+        ).hexdigest()
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS files ("
+            " audio_path TEXT PRIMARY KEY, size INTEGER, mtime REAL, stage TEXT NOT NULL,"
+            " json_file TEXT, attempts INTEGER NOT NULL DEFAULT 0, error TEXT,"
+            " updated_at REAL NOT NULL, params TEXT)"
+        )
+        columns = [row[1] for row in self._conn.execute("PRAGMA table_info(files)")]
+        if "params" not in columns:
+            # Manifestos anteriores à coluna: os arquivos recomeçam na primeira execução.
+            self._conn.execute("ALTER TABLE files ADD COLUMN params TEXT")
+        self._conn.commit()
+
+    def add(self, audio_files: Iterable[str]) -> None:
+        """Registra áudios baixados.
+
+        Um arquivo alterado desde o registro, ou registrado com outros
+        parâmetros, recomeça do zero.
+        """
+        now = time.time()
+        with self._lock:
+            for audio_file in audio_files:
+                audio_file = str(audio_file)
+                stat = os.stat(audio_file)
+                row = self._conn.execute(
+                    "SELECT size, mtime, params FROM files WHERE audio_path = ?", (audio_file,)
+                ).fetchone()
+                if row is not None and row == (stat.st_size, stat.st_mtime, self.params):
+                    continue
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO files (audio_path, size, mtime, stage, updated_at, params)"
+                    " VALUES (?, ?, ?, 'downloaded', ?, ?)",
+                    (audio_file, stat.st_size, stat.st_mtime, now, self.params),
+                )
+            self._conn.commit()
+
+    def mark(self, audio_file: str, stage: str, json_file: str = None) -> None:
+        """Registra a conclusão de uma etapa e zera as tentativas."""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE files SET stage = ?, json_file = COALESCE(?, json_file), attempts = 0,"
+                " error = NULL, updated_at = ? WHERE audio_path = ?",
+                (stage, json_file, time.time(), str(audio_file)),
+            )
+            self._conn.commit()
+
+    def fail(self, audio_file: str, error: str) -> None:
+        """Conta uma tentativa falha da próxima etapa do arquivo."""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE files SET attempts = attempts + 1, error = ?, updated_at = ?"
+                " WHERE audio_path = ?",
+                (error, time.time(), str(audio_file)),
+            )
+            self._conn.commit()
+
+    def record(self, audio_file: str, json_file: Optional[str]) -> None:
+        """Registra o resultado da transcrição de um arquivo (JSON salvo ou falha)."""
+        if json_file:
+            self.mark(audio_file, "saved", json_file)
+        else:
+            self.fail(audio_file, "falha ao transcrever ou salvar o JSON")
+
+    def pending(self, stage: str, audio_files: Iterable[str] = None) -> List[tuple]:
+        """(áudio, JSON) dos arquivos na etapa anterior a `stage` com tentativas restantes.
+
+        Com `audio_files`, considera apenas esses arquivos (os da execução atual).
+        """
+        previous = STAGES[STAGES.index(stage) - 1]
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT audio_path, json_file FROM files"
+                " WHERE stage = ? AND attempts < ? ORDER BY audio_path",
+                (previous, self.max_attempts),
+            ).fetchall()
+        if audio_files is not None:
+            selected = {str(audio_file) for audio_file in audio_files}
+            rows = [row for row in rows if row[0] in selected]
+        return rows
+
+    def retry(self, audio_files: Iterable[str]) -> None:
+        """Devolve as tentativas dos arquivos que desistiram, mantendo a etapa concluída."""
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE files SET attempts = 0 WHERE audio_path = ?",
+                [(str(audio_file),) for audio_file in audio_files],
+            )
+            self._conn.commit()
+
+    def reset(self, audio_files: Iterable[str]) -> None:
+        """Volta os arquivos para "downloaded" (por exemplo, com --refresh)."""
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE files SET stage = 'downloaded', attempts = 0, error = NULL"
+                " WHERE audio_path = ?",
+                [(str(audio_file),) for audio_file in audio_files],
+            )
+            self._conn.commit()
+
+    def summary(self) -> dict:
+        """Quantidade de arquivos por etapa e de arquivos que esgotaram as tentativas."""
+        with self._lock:
+            counts = dict(
+                self._conn.execute("SELECT stage, COUNT(*) FROM files GROUP BY stage").fetchall()
+            )
+            counts["exhausted"] = self._conn.execute(
+                "SELECT COUNT(*) FROM files WHERE stage != 'uploaded' AND attempts >= ?",
+                (self.max_attempts,),
+            ).fetchone()[0]
+        return counts
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+def run_stage(manifest: RunManifest, stage: str, step, audio_files: Iterable[str] = None) -> None:
+    """Executa uma etapa sobre os arquivos pendentes, repetindo as falhas.
+
+    `step` recebe a lista de (áudio, JSON) pendentes e marca cada arquivo no
+    manifesto (`mark` ou `fail`). Como cada falha consome uma tentativa, as
+    repetições param após `max_attempts` rodadas.
+    """
+    for _ in range(manifest.max_attempts):
+        pending = manifest.pending(stage, audio_files)
+        if not pending:
+            return
+        logging.info(f"Etapa {stage}: {len(pending)} arquivos pendentes")
+        try:
+            step(pending)
+        except Exception as e:
+            logging.error(f"Erro na etapa {stage}: {e}")
+            for audio_file, _ in pending:
+                manifest.fail(audio_file, str(e))
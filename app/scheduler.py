@@ -0,0 +1,127 @@
+import heapq
+import logging
+import os
+import time
+import wave
+
+from typing import Dict, List
+
+import av
+
+from azure_blob_loader import load_manifest
+
+
+# Fator de tempo real (segundos de processamento por segundo de áudio) usado
+# nas estimativas; ajuste com o `observed_rtf` dos relatórios anteriores.
+DEFAULT_RTF = 0.15
+
+# Taxa usada quando o cabeçalho não informa a duração (MP3/M4A a 128 kbps).
+FALLBACK_BYTES_PER_SECOND = 16000
+
+
+def probe_duration(audio_file: str) -> float:
+    """Duração do áudio em segundos, lida do cabeçalho sem decodificar o conteúdo.
+
+    WAV usa o cabeçalho RIFF; os demais formatos usam a duração do contêiner
+    informada pelo PyAV. Se nada disso funcionar, estima pelo tamanho do arquivo.
+    """
+    audio_file = str(audio_file)
+    if audio_file.lower().endswith(".wav"):
+        try:
+            with wave.open(audio_file, "rb") as f:
+                return f.getnframes() / f.getframerate()
+        except (wave.Error, EOFError) as e:
+            # WAV com µ-law, A-law ou GSM: o módulo `wave` só lê PCM.
+            logging.debug(f"Cabeçalho RIFF de {audio_file} não é PCM ({e}), lendo pelo PyAV")
+    try:
+        with av.open(audio_file) as container:
+            if container.duration:
+                return container.duration / av.time_base
+            stream = container.streams.audio[0]
+            if stream.duration and stream.time_base:
+                return float(stream.duration * stream.time_base)
+    except Exception as e:
+        logging.debug(f"Cabeçalho de {audio_file} sem duração ({e}), estimando pelo tamanho")
+    return os.path.getsize(audio_file) / FALLBACK_BYTES_PER_SECOND
+
+
+def load_priorities(audio_dir: str) -> Dict[str, int]:
+    """Prioridades por arquivo a partir do metadado `priority` dos blobs baixados.
+
+    Lê o manifesto de download do diretório; arquivos sem a tag ficam com 0.
+    """
+    priorities = {}
+    for blob_name, entry in load_manifest(str(audio_dir)).items():
+        try:
+            priority = int(entry.get("priority") or 0)
+        except (TypeError, ValueError):
+            logging.warning(f"Prioridade inválida para {blob_name}: {entry.get('priority')}")
+            continue
+        priorities[os.path.abspath(os.path.join(str(audio_dir), blob_name))] = priority
+    return priorities
+
+
+def estimate_makespan(durations: List[float], workers: int, rtf: float) -> float:
+    """Tempo total estimado distribuindo os arquivos, na ordem dada, ao worker livre primeiro."""
+    finish_times = [0.0] * max(1, workers)
+    for duration in durations:
+        heapq.heapreplace(finish_times, finish_times[0] + duration * rtf)
+    return max(finish_times)
+
+
+class Schedule:
+    """Ordem de processamento de um lote e a estimativa do seu término.
+
+    Os arquivos são ordenados por prioridade e, dentro da mesma prioridade, do
+    mais longo para o mais curto (LPT). Como os workers pegam o próximo arquivo
+    da fila assim que ficam livres, as ligações longas começam cedo e não
+    sobram para o fim do lote com os demais workers parados.
+    """
+
+    def __init__(
+        self,
+        audio_files: List[str],
+        workers: int = 1,
+        priorities: Dict[str, int] = None,
+        rtf: float = DEFAULT_RTF,
+    ):
+        priorities = priorities or {}
+        self.workers = max(1, workers)
+        self.rtf = rtf
+        self.durations = {str(audio_file): probe_duration(audio_file) for audio_file in audio_files}
+        self.order = sorted(
+            self.durations,
+            key=lambda audio_file: (
+                -priorities.get(os.path.abspath(audio_file), 0),
+                -self.durations[audio_file],
+            ),
+        )
+        self.audio_seconds = sum(self.durations.values())
+        self.estimated_seconds = estimate_makespan(
+            [self.durations[audio_file] for audio_file in self.order], self.workers, rtf
+        )
+        self._started = None
+
+    def start(self) -> None:
+        self._started = time.perf_counter()
+        logging.info(
+            f"Agenda: {len(self.order)} arquivos, {self.audio_seconds / 3600:.2f} h de áudio, "
+            f"{self.workers} workers, término estimado em {self.estimated_seconds / 60:.1f} min"
+        )
+
+    def report(self) -> dict:
+        """Compara o tempo estimado com o tempo real desde `start`."""
+        actual_seconds = time.perf_counter() - self._started
+        return {
+            "files": len(self.order),
+            "workers": self.workers,
+            "audio_seconds": self.audio_seconds,
+            "estimated_seconds": self.estimated_seconds,
+            "actual_seconds": actual_seconds,
+            "estimate_error": (actual_seconds - self.estimated_seconds) / self.estimated_seconds
+            if self.estimated_seconds
+            else None,
+            "observed_rtf": actual_seconds * self.workers / self.audio_seconds
+            if self.audio_seconds
+            else None,
+        }
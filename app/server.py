@@ -0,0 +1,515 @@
+import argparse
+import logging
+import math
+import os
+import signal
+import sqlite3
+import threading
+import time
+import ujson
+import urllib.request
+import uuid
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional, Tuple
+
+from magic_words import DEFAULT_LEXICON, load_matcher
+from model_registry import resolve_model
+from recogni import (
+    channel_workers,
+    load_model,
+    process_file_result,
+    resolve_device,
+    upload_sinks,
+)
+from telemetry import telemetry
+from transcript_io import FORMATS, check_format, load_transcript
+from transcription_cache import TranscriptionCache
+from vad import vad_parameters as build_vad_parameters
+
+
+# Estados finais de um job.
+FINISHED = ("done", "failed")
+
+
+class JobQueue:
+    """Fila persistente (SQLite) de jobs de transcrição.
+
+    Jobs aceitos sobrevivem a uma reinicialização do servidor: os que estavam
+    em execução quando o processo parou voltam para a fila ao reabri-la.
+    """
+
+    def __init__(self, db_path: str):
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id TEXT PRIMARY KEY, request TEXT NOT NULL, status TEXT NOT NULL,"
+            " json_file TEXT, error TEXT, created_at REAL NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_status ON jobs (status, created_at)")
+        requeued = self._conn.execute(
+            "UPDATE jobs SET status = 'queued' WHERE status = 'running'"
+        ).rowcount
+        self._conn.commit()
+        if requeued:
+            logging.info(f"{requeued} jobs interrompidos voltaram para a fila")
+
+    def submit(self, request: dict) -> str:
+        """Enfileira um job e retorna o seu id."""
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._changed:
+            self._conn.execute(
+                "INSERT INTO jobs (id, request, status, created_at, updated_at)"
+                " VALUES (?, ?, 'queued', ?, ?)",
+                (job_id, ujson.dumps(request), now, now),
+            )
+            self._conn.commit()
+            self._changed.notify_all()
+        return job_id
+
+    def claim(self, timeout: float = 1.0) -> Optional[Tuple[str, dict]]:
+        """Marca o job mais antigo da fila como em execução (espera até `timeout`)."""
+        with self._changed:
+            row = self._next()
+            if row is None:
+                self._changed.wait(timeout)
+                row = self._next()
+            if row is None:
+                return None
+            self._set_status(row[0], "running")
+        return row[0], ujson.loads(row[1])
+
+    def _next(self):
+        return self._conn.execute(
+            "SELECT id, request FROM jobs WHERE status = 'queued' ORDER BY created_at LIMIT 1"
+        ).fetchone()
+
+    def _set_status(self, job_id: str, status: str, json_file: str = None, error: str = None) -> None:
+        self._conn.execute(
+            "UPDATE jobs SET status = ?, json_file = ?, error = ?, updated_at = ? WHERE id = ?",
+            (status, json_file, error, time.time(), job_id),
+        )
+        self._conn.commit()
+
+    def finish(self, job_id: str, json_file: str = None, error: str = None) -> None:
+        """Registra o resultado (ou o erro) de um job e acorda quem o aguarda."""
+        with self._changed:
+            self._set_status(job_id, "failed" if error else "done", json_file, error)
+            self._changed.notify_all()
+
+    def get(self, job_id: str) -> Optional[dict]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id, request, status, json_file, error, created_at, updated_at"
+                " FROM jobs WHERE id = ?",
+                (job_id,),
+            ).fetchone()
+        if row is None:
+            return None
+        return {
+            "id": row[0],
+            "request": ujson.loads(row[1]),
+            "status": row[2],
+            "json_file": row[3],
+            "error": row[4],
+            "created_at": row[5],
+            "updated_at": row[6],
+        }
+
+    def wait(self, job_id: str, timeout: float) -> Optional[dict]:
+        """Aguarda o job terminar (ou o `timeout`) e retorna o seu estado."""
+        deadline = time.monotonic() + timeout
+        job = self.get(job_id)
+        while job is not None and job["status"] not in FINISHED:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            with self._changed:
+                self._changed.wait(min(remaining, 1.0))
+            job = self.get(job_id)
+        return job
+
+    def counts(self) -> dict:
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return dict(rows)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+def blob_local_path(download_path: str, blob_name: str) -> str:
+    """Caminho local de um blob em `download_path`; recusa nomes que saem do diretório."""
+    root = os.path.abspath(download_path)
+    local_path = os.path.abspath(os.path.join(root, blob_name))
+    if os.path.commonpath([root, local_path]) != root or local_path == root:
+        raise ValueError(f"nome de blob inválido: {blob_name}")
+    return local_path
+
+
+class TranscriptionServer:
+    """Serviço de transcrição com o modelo carregado uma única vez.
+
+    Os jobs (caminho local ou nome de blob) chegam pela API HTTP, ficam na
+    `JobQueue` e são processados por `concurrency` threads que compartilham o
+    mesmo modelo (com uma réplica do CTranslate2 por thread). O resultado é o
+    mesmo JSON do `recogni.py`, consultado em `GET /jobs/<id>` ou enviado para
+    o `callback_url` do job.
+    """
+
+    def __init__(
+        self,
+        model,
+        queue: JobQueue,
+        prompt: str,
+        beam_size: int,
+        batch_size: int = 0,
+        cache: TranscriptionCache = None,
+        matcher=None,
+        vad_parameters: dict = None,
+        concurrency: int = 1,
+        max_queued: int = 1000,
+        download_path: str = "audio_samples",
+        sinks: list = None,
+        output_format: str = "json",
+        agent_channel: int = None,
+    ):
+        self.model = model
+        self.queue = queue
+        self.prompt = prompt
+        self.beam_size = beam_size
+        self.batch_size = batch_size
+        self.cache = cache
+        self.matcher = matcher
+        self.vad_parameters = vad_parameters
+        self.concurrency = max(1, concurrency)
+        self.max_queued = max_queued
+        self.download_path = download_path
+        self.sinks = sinks or []
+        self.output_format = output_format
+        self.agent_channel = agent_channel
+        self.draining = threading.Event()
+        self._workers = []
+        self._httpd = None
+
+    def fetch_blob(self, blob_name: str) -> str:
+        """Baixa um áudio do contêiner CONTAINER_AUDIOS para `download_path`."""
+        from azure_blob_loader import download_blob_to_file
+        from azure_uploader_stgacc import get_blob_service_client
+
+        local_path = blob_local_path(self.download_path, blob_name)
+        container_client = get_blob_service_client(
+            os.environ["STORAGE_ACCOUNT_KEY"]
+        ).get_container_client(os.environ["CONTAINER_AUDIOS"])
+        blob = container_client.get_blob_client(blob_name).get_blob_properties()
+        with telemetry.stage("download", blob=blob_name):
+            download_blob_to_file(container_client, blob, local_path)
+        return local_path
+
+    def run_job(self, request: dict) -> str:
+        """Processa um job e retorna o caminho do JSON salvo."""
+        if request.get("blob"):
+            audio_file = self.fetch_blob(request["blob"])
+        else:
+            audio_file = request["audio_path"]
+        result = process_file_result(
+            audio_file,
+            request.get("prompt") or self.prompt,
+            self.model,
+            self.beam_size,
+            self.batch_size,
+            self.cache,
+            bool(request.get("refresh")),
+            self.matcher,
+            self.vad_parameters,
+            self.output_format,
+            self.agent_channel,
+        )
+        if not result:
+            raise RuntimeError(f"Falha ao transcrever {audio_file}")
+        for sink in self.sinks:
+            if sink(str(audio_file), result) is False:
+                raise RuntimeError(f"Falha ao enviar o resultado de {audio_file}")
+        return result[0]
+
+    def result(self, job: dict) -> dict:
+        """Estado público de um job, com o JSON de resultado quando concluído."""
+        document = {key: job[key] for key in ("id", "status", "error", "created_at", "updated_at")}
+        if job["status"] == "done" and job["json_file"]:
+            document["result"] = load_transcript(job["json_file"])
+        return document
+
+    def notify(self, job_id: str, callback_url: str) -> None:
+        """Envia o estado final do job para o `callback_url` informado."""
+        try:
+            request = urllib.request.Request(
+                callback_url,
+                data=ujson.dumps(self.result(self.queue.get(job_id)), ensure_ascii=False).encode("utf-8"),
+                headers={"Content-Type": "application/json"},
+                method="POST",
+            )
+            # Respostas 4xx/5xx levantam HTTPError.
+            with urllib.request.urlopen(request, timeout=30):
+                pass
+        except Exception as e:
+            logging.error(f"Erro ao notificar {callback_url} sobre o job {job_id}: {e}")
+
+    def _worker_loop(self) -> None:
+        while not self.draining.is_set():
+            claimed = self.queue.claim()
+            if claimed is None:
+                continue
+            job_id, request = claimed
+            telemetry.set_gauge("recogni_queue_depth", self.queue.counts().get("queued", 0), queue="jobs")
+            try:
+                self.queue.finish(job_id, json_file=self.run_job(request))
+                logging.info(f"Job {job_id} concluído")
+            except Exception as e:
+                logging.error(f"Erro no job {job_id}: {e}")
+                self.queue.finish(job_id, error=str(e))
+            if request.get("callback_url"):
+                self.notify(job_id, request["callback_url"])
+
+    def start_workers(self) -> None:
+        for i in range(self.concurrency):
+            worker = threading.Thread(target=self._worker_loop, name=f"job-worker-{i}")
+            worker.start()
+            self._workers.append(worker)
+
+    def drain(self, *_) -> None:
+        """Para de aceitar jobs, conclui os que estão em execução e encerra o servidor.
+
+        Jobs ainda na fila continuam gravados e são retomados na próxima execução.
+        """
+        if self.draining.is_set():
+            return
+        logging.info("Encerrando: aguardando os jobs em execução")
+        self.draining.set()
+        threading.Thread(target=self._shutdown, name="server-drain").start()
+
+    def _shutdown(self) -> None:
+        for worker in self._workers:
+            worker.join()
+        if self._httpd is not None:
+            self._httpd.shutdown()
+
+    def serve(self, host: str, port: int) -> None:
+        """Atende a API HTTP até `drain` ser chamado (por exemplo, no SIGTERM)."""
+        server = self
+
+        class JobHandler(BaseHTTPRequestHandler):
+            def _send(self, status: int, document: dict) -> None:
+                body = ujson.dumps(document, ensure_ascii=False).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_POST(self):
+                if self.path != "/jobs":
+                    self.send_error(404)
+                    return
+                if server.draining.is_set():
+                    self._send(503, {"error": "servidor em encerramento"})
+                    return
+                try:
+                    length = int(self.headers.get("Content-Length", 0))
+                    request = ujson.loads(self.rfile.read(length) or b"{}")
+                except ValueError:
+                    self._send(400, {"error": "corpo JSON inválido"})
+                    return
+                if not isinstance(request, dict):
+                    self._send(400, {"error": "o corpo deve ser um objeto JSON"})
+                    return
+                for key in ("audio_path", "blob", "prompt", "callback_url"):
+                    if request.get(key) is not None and not isinstance(request[key], str):
+                        self._send(400, {"error": f"'{key}' deve ser texto"})
+                        return
+                try:
+                    wait = float(request.pop("wait", 0) or 0)
+                except (TypeError, ValueError):
+                    wait = math.nan
+                if not math.isfinite(wait):
+                    self._send(400, {"error": "'wait' deve ser um número de segundos"})
+                    return
+                if not request.get("audio_path") and not request.get("blob"):
+                    self._send(400, {"error": "informe 'audio_path' ou 'blob'"})
+                    return
+                if request.get("blob"):
+                    try:
+                        blob_local_path(server.download_path, request["blob"])
+                    except ValueError as e:
+                        self._send(400, {"error": str(e)})
+                        return
+                if request.get("audio_path") and not os.path.isfile(request["audio_path"]):
+                    self._send(400, {"error": f"arquivo não encontrado: {request['audio_path']}"})
+                    return
+                if server.queue.counts().get("queued", 0) >= server.max_queued:
+                    self._send(429, {"error": "fila cheia"})
+                    return
+
+                job_id = server.queue.submit(request)
+                if wait > 0:
+                    job = server.queue.wait(job_id, wait)
+                    if job["status"] in FINISHED:
+                        self._send(200, server.result(job))
+                        return
+                self._send(202, {"id": job_id, "status": "queued"})
+
+            def do_GET(self):
+                if self.path == "/health":
+                    status = "draining" if server.draining.is_set() else "ok"
+                    self._send(200, {"status": status, "jobs": server.queue.counts()})
+                elif self.path == "/metrics":
+                    body = telemetry.render().encode("utf-8")
+                    self.send_response(200)
+                    self.send_header("Content-Type", "text/plain; version=0.0.4")
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                elif self.path.startswith("/jobs/"):
+                    job = server.queue.get(self.path[len("/jobs/"):])
+                    if job is None:
+                        self._send(404, {"error": "job não encontrado"})
+                    else:
+                        self._send(200, server.result(job))
+                else:
+                    self.send_error(404)
+
+            def log_message(self, format, *args):
+                logging.debug(format % args)
+
+        self._httpd = ThreadingHTTPServer((host, port), JobHandler)
+        self._httpd.daemon_threads = True
+        self.start_workers()
+        logging.info(f"Servidor de transcrição em http://{host}:{port}")
+        print(f"Servidor de transcrição em http://{host}:{port}")
+        try:
+            self._httpd.serve_forever()
+        finally:
+            self._httpd.server_close()
+            self.queue.close()
+            if self.cache is not None:
+                self.cache.close()
+            logging.info("Servidor encerrado")
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(
+        description="Servidor de transcrição com o modelo carregado e fila de jobs persistente"
+    )
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument(
+        "--prompt",
+        default="Essa é uma transcrição de uma ligação para avaliação de NPS da empresa TOTVS.",
+        help="Prompt padrão (cada job pode informar o seu)",
+    )
+    parser.add_argument("--model_size", default="large-v3", help="Tamanho do modelo Whisper")
+    parser.add_argument(
+        "--model_dir", help="Registro local de modelos (padrão: $MODEL_DIR; sem acesso à rede)"
+    )
+    parser.add_argument(
+        "--verify_model", action="store_true", help="Confere os SHA-256 do modelo antes de carregá-lo"
+    )
+    parser.add_argument("--beam_size", type=int, default=5, help="Tamanho do beam")
+    parser.add_argument("--device", default="cuda", help="Dispositivo (cuda ou cpu)")
+    parser.add_argument("--compute_type", default="int8_float16", help="Tipo de computação")
+    parser.add_argument("--cpu_threads", type=int, default=0, help="Threads de CPU por réplica")
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=1,
+        help="Jobs transcritos ao mesmo tempo (uma réplica do modelo por job)",
+    )
+    parser.add_argument(
+        "--max_queued", type=int, default=1000, help="Jobs na fila antes de recusar novos (429)"
+    )
+    parser.add_argument(
+        "--queue_path", default="./cache/jobs.sqlite", help="Arquivo SQLite da fila de jobs"
+    )
+    parser.add_argument("--batched", action="store_true", help="Usa o BatchedInferencePipeline")
+    parser.add_argument("--batch_size", type=int, default=16, help="Tamanho do lote com --batched")
+    parser.add_argument(
+        "--cache_path",
+        default="./cache/transcriptions.sqlite",
+        help="Arquivo SQLite do cache de transcrições",
+    )
+    parser.add_argument("--cache_max_mb", type=float, default=1024, help="Tamanho máximo do cache")
+    parser.add_argument("--no-cache", dest="no_cache", action="store_true", help="Desativa o cache")
+    parser.add_argument("--lexicon", default=DEFAULT_LEXICON, help="Léxico de palavras mágicas")
+    parser.add_argument("--vad", action="store_true", help="Remove silêncio antes da decodificação")
+    parser.add_argument(
+        "--download_path", default="audio_samples", help="Destino dos áudios de jobs com 'blob'"
+    )
+    parser.add_argument(
+        "--upload",
+        action="store_true",
+        help="Envia cada resultado ao Cosmos DB e ao Blob Storage, como o modo --pipeline",
+    )
+    parser.add_argument(
+        "--speakers", action="store_true", help="Separa atendente e cliente por canal"
+    )
+    parser.add_argument(
+        "--agent_channel", type=int, choices=(0, 1), default=0, help="Canal do atendente"
+    )
+    parser.add_argument(
+        "--output_format", choices=sorted(FORMATS), default="json", help="Formato do resultado"
+    )
+    parser.add_argument("--trace_file", help="Arquivo JSON Lines de trace (ver --trace_file)")
+    args = parser.parse_args(argv)
+    telemetry.configure(args.trace_file)
+    check_format(args.output_format)
+
+    batch_size = args.batch_size if args.batched else 0
+    vad_parameters = build_vad_parameters() if args.vad else None
+    agent_channel = args.agent_channel if args.speakers else None
+    cache = None
+    if not args.no_cache:
+        cache_params = {
+            "model_size": args.model_size,
+            "compute_type": args.compute_type,
+            "beam_size": args.beam_size,
+            "batch_size": batch_size,
+            "vad_parameters": vad_parameters,
+        }
+        if agent_channel is not None:
+            cache_params["agent_channel"] = agent_channel
+        cache = TranscriptionCache(args.cache_path, args.cache_max_mb, cache_params)
+    model = load_model(
+        resolve_model(args.model_size, args.model_dir, args.verify_model),
+        resolve_device(args.device),
+        args.compute_type,
+        args.cpu_threads,
+        args.batched,
+        num_workers=max(1, args.concurrency) * channel_workers(agent_channel),
+    )
+    server = TranscriptionServer(
+        model,
+        JobQueue(args.queue_path),
+        args.prompt,
+        args.beam_size,
+        batch_size,
+        cache,
+        load_matcher(args.lexicon),
+        vad_parameters,
+        args.concurrency,
+        args.max_queued,
+        args.download_path,
+        upload_sinks(args.model_size) if args.upload else None,
+        args.output_format,
+        agent_channel,
+    )
+    signal.signal(signal.SIGTERM, server.drain)
+    signal.signal(signal.SIGINT, server.drain)
+    server.serve(args.host, args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+import bisect
+import logging
+import os
+import threading
+import time
+import ujson
+
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+# Limites (segundos) das faixas dos histogramas de duração.
+DURATION_BUCKETS = [0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600]
+
+
+def _key(name: str, labels: dict) -> tuple:
+    return name, tuple(sorted((labels or {}).items()))
+
+
+def _format_labels(labels: tuple, extra: dict = None) -> str:
+    items = list(labels) + list((extra or {}).items())
+    if not items:
+        return ""
+    return "{" + ",".join(f'{name}="{value}"' for name, value in items) + "}"
+
+
+class Telemetry:
+    """Métricas no estilo Prometheus (contadores, gauges e histogramas) e trace em JSON Lines.
+
+    Os valores ficam em memória e podem ser expostos por HTTP (`serve`) e
+    combinados entre processos: cada worker envia `snapshot(reset=True)` e o
+    processo principal aplica com `merge`.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = {}
+        self.gauges = {}
+        self.histograms = {}
+        self.trace_file = None
+        self._trace = None
+        self._server = None
+
+    def configure(self, trace_file: str = None, metrics_port: int = None) -> None:
+        """Ativa o arquivo de trace e/ou o endpoint HTTP de métricas."""
+        if trace_file:
+            os.makedirs(os.path.dirname(trace_file) or ".", exist_ok=True)
+            self.trace_file = trace_file
+            self._trace = open(trace_file, "a", encoding="utf-8", buffering=1)
+        if metrics_port:
+            self.serve(metrics_port)
+
+    def inc(self, name: str, value: float = 1, **labels) -> None:
+        key = _key(name, labels)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def set_gauge(self, name: str, value: float, **labels) -> None:
+        with self._lock:
+            self.gauges[_key(name, labels)] = value
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        key = _key(name, labels)
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = [0] * (len(DURATION_BUCKETS) + 1) + [0.0, 0]
+            histogram[bisect.bisect_left(DURATION_BUCKETS, value)] += 1
+            histogram[-2] += value
+            histogram[-1] += 1
+
+    def event(self, event: str, **fields) -> None:
+        """Grava um evento no trace (uma linha JSON por evento)."""
+        if self._trace is None:
+            return
+        line = ujson.dumps({"ts": time.time(), "pid": os.getpid(), "event": event, **fields})
+        with self._lock:
+            self._trace.write(line + "\n")
+
+    @contextmanager
+    def stage(self, name: str, **fields):
+        """Mede a duração de um estágio; erros incrementam `recogni_errors_total`."""
+        start = time.perf_counter()
+        status = "ok"
+        try:
+            yield
+        except BaseException:
+            status = "error"
+            self.inc("recogni_errors_total", stage=name)
+            raise
+        finally:
+            seconds = time.perf_counter() - start
+            self.observe("recogni_stage_seconds", seconds, stage=name)
+            self.event("stage", stage=name, seconds=seconds, status=status, **fields)
+
+    def snapshot(self, reset: bool = False) -> dict:
+        """Cópia dos contadores e histogramas (para enviar a outro processo)."""
+        with self._lock:
+            snapshot = {
+                "counters": list(self.counters.items()),
+                "histograms": [(key, list(values)) for key, values in self.histograms.items()],
+            }
+            if reset:
+                self.counters.clear()
+                self.histograms.clear()
+        return snapshot
+
+    def merge(self, snapshot: dict) -> None:
+        """Soma os valores de um `snapshot` de outro processo."""
+        with self._lock:
+            for (name, labels), value in snapshot["counters"]:
+                key = (name, tuple(tuple(label) for label in labels))
+                self.counters[key] = self.counters.get(key, 0) + value
+            for (name, labels), values in snapshot["histograms"]:
+                key = (name, tuple(tuple(label) for label in labels))
+                current = self.histograms.setdefault(key, [0] * len(values))
+                self.histograms[key] = [a + b for a, b in zip(current, values)]
+
+    def render(self) -> str:
+        """Métricas no formato texto do Prometheus."""
+        lines = []
+        with self._lock:
+            for (name, labels), value in sorted(self.counters.items()):
+                lines.append(f"{name}{_format_labels(labels)} {value}")
+            for (name, labels), value in sorted(self.gauges.items()):
+                lines.append(f"{name}{_format_labels(labels)} {value}")
+            for (name, labels), values in sorted(self.histograms.items()):
+                cumulative = 0
+                for bound, count in zip(DURATION_BUCKETS + ["+Inf"], values):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{_format_labels(labels, {'le': bound})} {cumulative}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {values[-2]}")
+                lines.append(f"{name}_count{_format_labels(labels)} {values[-1]}")
+        return "\n".join(lines) + "\n"
+
+    def serve(self, port: int, host: str = "127.0.0.1") -> None:
+        """Expõe `GET /metrics` em uma thread em segundo plano."""
+        telemetry = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path != "/metrics":
+                    self.send_error(404)
+                    return
+                body = telemetry.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), MetricsHandler)
+        threading.Thread(target=self._server.serve_forever, name="metrics-http", daemon=True).start()
+        logging.info(f"Métricas disponíveis em http://{host}:{port}/metrics")
+
+
+# Instância padrão do processo, usada por todos os módulos.
+telemetry = Telemetry()
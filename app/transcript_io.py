@@ -0,0 +1,160 @@
+import gzip
+import logging
+import os
+import ujson
+
+
+# Formatos de saída (`--output_format`) e a extensão de cada um.
+FORMATS = {
+    "json": ".json",
+    "jsonl": ".jsonl",
+    "jsonl.gz": ".jsonl.gz",
+    "json.gz": ".json.gz",
+    "msgpack": ".msgpack",
+}
+
+# Formatos gravados segmento a segmento, enquanto a decodificação avança.
+STREAMING_FORMATS = ("jsonl", "jsonl.gz")
+
+
+def transcript_format(path: str) -> str:
+    """Formato de um arquivo de transcrição a partir da extensão (None se desconhecido)."""
+    for output_format, extension in sorted(FORMATS.items(), key=lambda item: -len(item[1])):
+        if str(path).endswith(extension):
+            return output_format
+    return None
+
+
+def is_transcript(path: str) -> bool:
+    return transcript_format(path) is not None
+
+
+def _msgpack():
+    try:
+        import msgpack
+    except ImportError:
+        raise RuntimeError("O formato msgpack requer o pacote 'msgpack' (pip install msgpack)")
+    return msgpack
+
+
+def check_format(output_format: str) -> None:
+    """Falha logo no início se o formato depender de um pacote não instalado."""
+    if output_format == "msgpack":
+        _msgpack()
+
+
+def _open_text(path: str, mode: str, compressed: bool = None):
+    if compressed is None:
+        compressed = str(path).endswith(".gz")
+    if compressed:
+        return gzip.open(path, mode + "t", encoding="utf-8", compresslevel=6)
+    return open(path, mode, encoding="utf-8")
+
+
+class TranscriptWriter:
+    """Grava uma transcrição em JSON Lines à medida que os segmentos ficam prontos.
+
+    A primeira linha traz os campos conhecidos antes da decodificação (prompt,
+    áudio), cada linha seguinte é um segmento e a última traz as métricas e os
+    demais campos do resultado. O arquivo é gravado como `.part` e só recebe o
+    nome final em `close`, então uma transcrição interrompida nunca parece
+    completa.
+    """
+
+    def __init__(self, path: str, **header):
+        self.path = path
+        self.header = header
+        self._part = path + ".part"
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._file = _open_text(self._part, "w", compressed=path.endswith(".gz"))
+        self._write(header)
+
+    def _write(self, document: dict) -> None:
+        self._file.write(ujson.dumps(document, ensure_ascii=False))
+        self._file.write("\n")
+
+    def write_segment(self, segment: dict) -> None:
+        self._write(segment)
+
+    def close(self, data: dict) -> str:
+        """Grava a linha final com os campos de `data` ainda não gravados e publica o arquivo."""
+        self._write(
+            {
+                key: value
+                for key, value in data.items()
+                if key != "transcription" and key not in self.header
+            }
+        )
+        self._file.close()
+        os.replace(self._part, self.path)
+        return self.path
+
+    def abort(self) -> None:
+        """Descarta o arquivo parcial."""
+        self._file.close()
+        try:
+            os.remove(self._part)
+        except OSError as e:
+            logging.warning(f"Não foi possível remover {self._part}: {e}")
+
+
+def write_transcript(path: str, data: dict) -> str:
+    """Grava o resultado no formato indicado pela extensão de `path`, de forma atômica."""
+    output_format = transcript_format(path)
+    if output_format in STREAMING_FORMATS:
+        writer = TranscriptWriter(
+            path, **{key: value for key, value in data.items() if key not in ("transcription", "metrics")}
+        )
+        for segment in data.get("transcription", []):
+            writer.write_segment(segment)
+        return writer.close(data)
+
+    tmp_file = path + ".tmp"
+    if output_format == "msgpack":
+        payload = _msgpack().packb(data, use_bin_type=True)
+        with open(tmp_file, "wb") as f:
+            f.write(payload)
+    elif output_format == "json.gz":
+        with gzip.open(tmp_file, "wt", encoding="utf-8", compresslevel=6) as f:
+            ujson.dump(data, f, ensure_ascii=False)
+    else:
+        with open(tmp_file, "w", encoding="utf-8") as f:
+            ujson.dump(data, f, ensure_ascii=False, indent=4)
+    os.replace(tmp_file, path)
+    return path
+
+
+def _read_lines(lines) -> dict:
+    documents = [ujson.loads(line) for line in lines if line.strip()]
+    if len(documents) < 2:
+        raise ValueError("Transcrição JSON Lines incompleta")
+    data = dict(documents[0])
+    data["transcription"] = documents[1:-1]
+    data.update(documents[-1])
+    return data
+
+
+def load_transcript(path: str) -> dict:
+    """Lê um resultado salvo em qualquer um dos `FORMATS`."""
+    output_format = transcript_format(path)
+    if output_format in STREAMING_FORMATS:
+        with _open_text(path, "r") as f:
+            return _read_lines(f)
+    if output_format == "msgpack":
+        with open(path, "rb") as f:
+            return _msgpack().unpackb(f.read(), raw=False)
+    with _open_text(path, "r") as f:
+        return ujson.load(f)
+
+
+def loads_transcript(payload: bytes, output_format: str) -> dict:
+    """Lê um resultado já em memória (por exemplo, o conteúdo de um blob)."""
+    if output_format.endswith(".gz"):
+        payload = gzip.decompress(payload)
+    if output_format == "msgpack":
+        return _msgpack().unpackb(payload, raw=False)
+    text = payload.decode("utf-8")
+    if output_format in STREAMING_FORMATS:
+        return _read_lines(text.splitlines())
+    return ujson.loads(text)
+
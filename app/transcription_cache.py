@@ -0,0 +1,115 @@
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+import ujson
+import zlib
+
+from typing import Optional, Tuple
+
+
+def audio_hash(audio_file: str, chunk_size: int = 1024 * 1024) -> str:
+    """Calcula o SHA-256 do conteúdo do áudio sem carregá-lo inteiro na memória."""
+    sha = hashlib.sha256()
+    with open(audio_file, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+class TranscriptionCache:
+    """Cache persistente (SQLite) de resultados de transcrição.
+
+    A chave combina o hash do conteúdo do áudio, o prompt e os parâmetros de
+    decodificação (`model_size`, `compute_type`, `beam_size`, ...). Um acerto
+    dispensa o `model.transcribe`. O tamanho total é limitado e as entradas
+    menos usadas recentemente são removidas primeiro (LRU).
+    """
+
+    def __init__(self, db_path: str, max_size_mb: float, params: dict):
+        """Abre (ou cria) o cache.
+
+        Args:
+            db_path (str): Caminho do arquivo SQLite.
+            max_size_mb (float): Tamanho máximo dos resultados armazenados, em MB.
+            params (dict): Parâmetros de decodificação que fazem parte da chave.
+        """
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self.max_bytes = int(max_size_mb * 1024 * 1024)
+        self.params = ujson.dumps(params, sort_keys=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS transcriptions ("
+            " key TEXT PRIMARY KEY, payload BLOB NOT NULL,"
+            " size INTEGER NOT NULL, last_access REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_last_access ON transcriptions (last_access)"
+        )
+        self._conn.commit()
+
+    def key(self, audio_file: str, prompt: str) -> str:
+        """Monta a chave a partir do conteúdo do áudio, prompt e parâmetros."""
+        material = "\x1f".join([audio_hash(audio_file), prompt or "", self.params])
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[dict]:
+        """Retorna o resultado armazenado para a chave, ou None."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT payload FROM transcriptions WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute(
+                "UPDATE transcriptions SET last_access = ? WHERE key = ?", (time.time(), key)
+            )
+            self._conn.commit()
+        return ujson.loads(zlib.decompress(row[0]))
+
+    def lookup(self, audio_file: str, prompt: str, refresh: bool = False) -> Tuple[str, Optional[dict]]:
+        """Calcula a chave do áudio e busca o resultado, exceto com `refresh`."""
+        key = self.key(audio_file, prompt)
+        if refresh:
+            return key, None
+        data = self.get(key)
+        if data is not None:
+            # O mesmo conteúdo pode estar em outro caminho nesta execução.
+            data["audio_path"] = str(audio_file)
+            logging.info(f"Transcrição de {audio_file} encontrada no cache")
+        return key, data
+
+    def put(self, key: str, data: dict) -> None:
+        """Armazena um resultado e aplica o limite de tamanho."""
+        payload = zlib.compress(ujson.dumps(data, ensure_ascii=False).encode("utf-8"))
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO transcriptions (key, payload, size, last_access)"
+                " VALUES (?, ?, ?, ?)",
+                (key, payload, len(payload), time.time()),
+            )
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self) -> None:
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM transcriptions").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        rows = self._conn.execute(
+            "SELECT key, size FROM transcriptions ORDER BY last_access"
+        ).fetchall()
+        evicted = []
+        for key, size in rows:
+            if total <= self.max_bytes:
+                break
+            evicted.append((key,))
+            total -= size
+        self._conn.executemany("DELETE FROM transcriptions WHERE key = ?", evicted)
+        logging.info(f"Cache de transcrições: {len(evicted)} entradas removidas (LRU)")
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
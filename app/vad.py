@@ -0,0 +1,111 @@
+import logging
+
+from typing import List, Optional
+
+import av
+from faster_whisper import decode_audio
+from faster_whisper.vad import VadOptions, get_speech_timestamps
+
+
+SAMPLING_RATE = 16000
+
+
+def vad_parameters(
+    threshold: float = 0.5,
+    min_silence_duration_ms: int = 2000,
+    speech_pad_ms: int = 400,
+    min_speech_duration_ms: int = 250,
+) -> dict:
+    """Parâmetros do filtro de voz (Silero VAD) repassados ao `model.transcribe`.
+
+    No `faster-whisper` 1.1 a probabilidade mínima de fala se chama `onset`.
+    """
+    return {
+        "onset": threshold,
+        "min_silence_duration_ms": min_silence_duration_ms,
+        "speech_pad_ms": speech_pad_ms,
+        "min_speech_duration_ms": min_speech_duration_ms,
+    }
+
+
+def speech_timing(info) -> dict:
+    """Tempo de fala e de silêncio a partir do `TranscriptionInfo` com VAD ativo."""
+    audio_seconds = info.duration
+    speech_seconds = info.duration_after_vad
+    return {
+        "audio_seconds": audio_seconds,
+        "speech_seconds": speech_seconds,
+        "silence_seconds": max(audio_seconds - speech_seconds, 0.0),
+        "speech_ratio": speech_seconds / audio_seconds if audio_seconds > 0 else 0.0,
+    }
+
+
+def audio_channels(audio_path: str) -> int:
+    """Número de canais do primeiro fluxo de áudio, lido do cabeçalho."""
+    with av.open(str(audio_path)) as container:
+        return container.streams.audio[0].channels
+
+
+def _speech_intervals(audio, parameters: dict) -> List[tuple]:
+    return [
+        (chunk["start"] / SAMPLING_RATE, chunk["end"] / SAMPLING_RATE)
+        for chunk in get_speech_timestamps(audio, VadOptions(**parameters))
+    ]
+
+
+def overlap_stats(left: List[tuple], right: List[tuple]) -> dict:
+    """Soma e conta os trechos em que os dois lados falam ao mesmo tempo."""
+    seconds = 0.0
+    count = 0
+    i = j = 0
+    while i < len(left) and j < len(right):
+        start = max(left[i][0], right[j][0])
+        end = min(left[i][1], right[j][1])
+        if end > start:
+            seconds += end - start
+            count += 1
+        if left[i][1] < right[j][1]:
+            i += 1
+        else:
+            j += 1
+    return {"talk_over_seconds": seconds, "talk_over_count": count}
+
+
+def union_seconds(left: List[tuple], right: List[tuple]) -> float:
+    """Tempo em que pelo menos um dos lados fala (união dos intervalos)."""
+    seconds = 0.0
+    end = None
+    for interval_start, interval_end in sorted(left + right):
+        if end is None or interval_start > end:
+            seconds += interval_end - interval_start
+            end = interval_end
+        elif interval_end > end:
+            seconds += interval_end - end
+            end = interval_end
+    return seconds
+
+
+def channel_speech(audio_path: str, parameters: dict, stereo: tuple = None) -> Optional[tuple]:
+    """Intervalos de fala (VAD) de cada canal de uma gravação estéreo.
+
+    Em gravações de central cada lado da ligação fica em um canal; para áudio
+    mono não há como separar os falantes e o retorno é None. `stereo` são os
+    canais já decodificados, se disponíveis.
+    """
+    try:
+        if stereo is not None:
+            left, right = stereo
+        elif audio_channels(audio_path) < 2:
+            return None
+        else:
+            left, right = decode_audio(str(audio_path), sampling_rate=SAMPLING_RATE, split_stereo=True)
+        return _speech_intervals(left, parameters), _speech_intervals(right, parameters)
+    except Exception as e:
+        logging.warning(f"Não foi possível separar a fala por canal em {audio_path}: {e}")
+        return None
+
+
+def talk_over(audio_path: str, parameters: dict, stereo: tuple = None) -> Optional[dict]:
+    """Estatísticas de fala simultânea entre os canais de uma gravação estéreo (None se mono)."""
+    intervals = channel_speech(audio_path, parameters, stereo)
+    return overlap_stats(*intervals) if intervals else None
@@ -0,0 +1,6 @@
+import os
+import sys
+
+
+# Os módulos da aplicação ficam em app/ e se importam pelo nome (rodam de dentro de app/).
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "app"))
@@ -0,0 +1,134 @@
+import random
+
+from collections import Counter
+
+import ujson
+
+from aggregation import PartialAggregate, Rollup, WordSketch, aggregate_files, call_day
+
+
+def _calls(count, seed=7):
+    """Ligações sintéticas com métricas e segmentos no formato do JSON de resultado."""
+    rng = random.Random(seed)
+    vocabulary = [f"palavra{i}" for i in range(200)]
+    calls = []
+    for i in range(count):
+        words = [rng.choice(vocabulary[: rng.randint(5, 200)]) for _ in range(rng.randint(1, 80))]
+        calls.append(
+            {
+                "audio_path": f"audios/atendente{i % 3}_202401{i % 28 + 1:02d}.wav",
+                "execution_date": "2024-02-01T10:00:00",
+                "transcription": [{"transcription": " ".join(words)}],
+                "metrics": {
+                    "total_words": len(words),
+                    "words_per_minute": rng.uniform(40, 260),
+                    "magic_word_percentages": {"obrigado": 100 / len(words)},
+                },
+            }
+        )
+    return calls
+
+
+def _exact(aggregate):
+    document = aggregate.to_dict()
+    return {
+        key: document[key]
+        for key in ("calls", "total_words", "wpm_histogram", "magic_words", "magic_word_percentages")
+    }
+
+
+def test_sketch_keeps_at_most_k_counters_within_misra_gries_bound():
+    rng = random.Random(1)
+    stream = [f"w{int(rng.paretovariate(1.2))}" for _ in range(5000)]
+    k = 16
+    sketch = WordSketch(k)
+    for start in range(0, len(stream), 100):
+        sketch.update(Counter(stream[start:start + 100]))
+
+    exact = Counter(stream)
+    assert len(exact) > k
+    assert len(sketch.counters) <= k
+    for word, count in exact.items():
+        estimate = sketch.counters.get(word, 0)
+        assert count - len(stream) / (k + 1) <= estimate <= count
+    assert sketch.top(1)[0][0] == exact.most_common(1)[0][0]
+
+
+def test_merged_sketches_keep_the_bound():
+    rng = random.Random(2)
+    streams = [[f"w{int(rng.paretovariate(1.1))}" for _ in range(2000)] for _ in range(4)]
+    k = 16
+    merged = WordSketch(k)
+    for stream in streams:
+        part = WordSketch(k)
+        part.update(Counter(stream))
+        merged.merge(part)
+
+    exact = Counter(word for stream in streams for word in stream)
+    total = sum(exact.values())
+    assert len(merged.counters) <= k
+    for word, count in exact.items():
+        assert count - total / (k + 1) <= merged.counters.get(word, 0) <= count
+
+
+def test_merging_partial_aggregates_equals_one_pass():
+    calls = _calls(60)
+    one_pass = PartialAggregate()
+    for data in calls:
+        one_pass.add(data)
+
+    parts = [PartialAggregate() for _ in range(4)]
+    for i, data in enumerate(calls):
+        parts[i % 4].add(data)
+    merged = PartialAggregate()
+    for part in parts:
+        merged.merge(part)
+
+    assert _exact(merged) == _exact(one_pass)
+    assert abs(merged.wpm_sum - one_pass.wpm_sum) < 1e-9
+    # Com contadores de sobra, o resumo é exato.
+    assert merged.words.counters == one_pass.words.counters
+
+
+def test_partial_aggregate_round_trip():
+    aggregate = PartialAggregate(sketch_size=8)
+    for data in _calls(20):
+        aggregate.add(data)
+
+    document = ujson.loads(ujson.dumps(aggregate.to_dict()))
+    restored = PartialAggregate.from_dict(document)
+
+    assert restored.to_dict() == aggregate.to_dict()
+    assert restored.words.k == 8
+
+
+def test_rollup_merge_matches_single_rollup(tmp_path):
+    calls = _calls(30)
+    json_files = []
+    for i, data in enumerate(calls):
+        json_file = tmp_path / f"{i}.json"
+        json_file.write_text(ujson.dumps(data), encoding="utf-8")
+        json_files.append(str(json_file))
+
+    pattern = r"_(\d{8})\."
+    whole = aggregate_files(json_files, r"^(atendente\d)", date_pattern=pattern)
+    halves = aggregate_files(json_files[:13], r"^(atendente\d)", date_pattern=pattern).merge(
+        aggregate_files(json_files[13:], r"^(atendente\d)", date_pattern=pattern)
+    )
+    restored = Rollup.from_documents(ujson.loads(ujson.dumps(halves.documents())))
+
+    assert {group: _exact(a) for group, a in restored.groups.items()} == {
+        group: _exact(a) for group, a in whole.groups.items()
+    }
+    assert ("agent", "atendente0") in whole.groups
+    assert ("day", "2024-01-01") in whole.groups
+
+
+def test_call_day_prefers_file_name_then_execution_date(tmp_path):
+    json_file = tmp_path / "call.json"
+    json_file.write_text("{}", encoding="utf-8")
+    data = {"audio_path": "a/ligacao_20240315_1.wav", "execution_date": "2024-04-01T08:00:00"}
+
+    assert call_day(data, str(json_file), r"_(\d{8})_") == "2024-03-15"
+    assert call_day(data, str(json_file)) == "2024-04-01"
+    assert call_day(data, str(json_file), r"_(\d{4}-\d\d)_") == "2024-04-01"
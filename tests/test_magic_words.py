@@ -0,0 +1,42 @@
+import pytest
+
+from magic_words import MagicWordMatcher, load_matcher
+
+
+@pytest.fixture
+def matcher():
+    return load_matcher()
+
+
+def test_longest_variant_counts_once(matcher):
+    counts = matcher.count("Muito obrigado pela ajuda, obrigada!")
+    assert counts == {"obrigado": 2}
+
+
+def test_longest_variant_wins_across_categories():
+    matcher = MagicWordMatcher({"licença": ["licença"], "com licença": ["com licença"]})
+    assert matcher.count("com licença, licença") == {"com licença": 1, "licença": 1}
+    assert matcher.count("com   licença") == {"com licença": 1}
+
+
+def test_ignores_accents_and_case(matcher):
+    counts = matcher.count("AGRADEÇO, agradeco. Perdao, PERDÃO. Com Licenca")
+    assert counts == {"agradeço": 2, "perdão": 2, "com licença": 1}
+
+
+def test_matches_whole_words_only(matcher):
+    assert matcher.count("obrigadão, desobrigado, obrigadinha") == {}
+    assert matcher.count("bom diazinho e boa tardinha") == {}
+
+
+def test_categories_without_matches_have_zero_percent(matcher):
+    counts = matcher.count("por favor, por favor")
+    percentages = matcher.percentages(counts, 10)
+    assert percentages["por favor"] == 20.0
+    assert percentages["obrigado"] == 0.0
+    assert set(percentages) == set(matcher.categories)
+
+
+def test_empty_lexicon_is_rejected():
+    with pytest.raises(ValueError):
+        MagicWordMatcher({})
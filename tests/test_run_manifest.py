@@ -0,0 +1,134 @@
+import sqlite3
+
+import pytest
+
+from run_manifest import RunManifest, run_stage
+
+
+PARAMS = {"model_size": "small", "beam_size": 5, "prompt": "atendimento"}
+
+
+@pytest.fixture
+def audio_files(tmp_path):
+    files = []
+    for name in ("a.wav", "b.wav", "c.wav"):
+        path = tmp_path / name
+        path.write_bytes(b"RIFF" + name.encode())
+        files.append(str(path))
+    return files
+
+
+def _open(tmp_path, params=PARAMS, max_attempts=3):
+    return RunManifest(str(tmp_path / "manifest.sqlite"), max_attempts, params)
+
+
+def test_resumes_from_last_completed_stage(tmp_path, audio_files):
+    manifest = _open(tmp_path)
+    manifest.add(audio_files)
+    manifest.record(audio_files[0], "a.json")
+    manifest.record(audio_files[1], "b.json")
+    manifest.mark(audio_files[0], "indexed")
+    manifest.close()
+
+    manifest = _open(tmp_path)
+    manifest.add(audio_files)
+    assert [audio for audio, _ in manifest.pending("saved", audio_files)] == [audio_files[2]]
+    assert manifest.pending("indexed", audio_files) == [(audio_files[1], "b.json")]
+    assert manifest.pending("uploaded", audio_files) == [(audio_files[0], "a.json")]
+
+
+def test_changed_params_restart_files(tmp_path, audio_files):
+    manifest = _open(tmp_path)
+    manifest.add(audio_files)
+    for audio_file in audio_files:
+        manifest.record(audio_file, audio_file + ".json")
+    manifest.close()
+
+    manifest = _open(tmp_path, {**PARAMS, "model_size": "large-v3"})
+    manifest.add(audio_files)
+    assert [audio for audio, _ in manifest.pending("saved", audio_files)] == audio_files
+
+    # Os mesmos parâmetros em outra ordem não mudam o hash.
+    manifest = _open(tmp_path, dict(reversed(list({**PARAMS, "model_size": "large-v3"}.items()))))
+    for audio_file in audio_files:
+        manifest.record(audio_file, audio_file + ".json")
+    manifest.add(audio_files)
+    assert manifest.pending("saved", audio_files) == []
+
+
+def test_changed_file_restarts(tmp_path, audio_files):
+    manifest = _open(tmp_path)
+    manifest.add(audio_files)
+    manifest.record(audio_files[0], "a.json")
+    with open(audio_files[0], "ab") as f:
+        f.write(b"mais audio")
+    manifest.add(audio_files)
+    assert audio_files[0] in [audio for audio, _ in manifest.pending("saved", audio_files)]
+
+
+def test_stops_after_max_attempts_and_retry_restores_them(tmp_path, audio_files):
+    manifest = _open(tmp_path, max_attempts=2)
+    manifest.add(audio_files)
+    calls = []
+
+    def step(pending):
+        calls.append([audio for audio, _ in pending])
+        for audio_file, _ in pending:
+            if audio_file == audio_files[1]:
+                manifest.fail(audio_file, "falhou")
+            else:
+                manifest.mark(audio_file, "saved", audio_file + ".json")
+
+    run_stage(manifest, "saved", step, audio_files)
+    assert calls == [audio_files, [audio_files[1]]]
+    assert manifest.pending("saved", audio_files) == []
+    assert manifest.summary() == {"downloaded": 1, "saved": 2, "exhausted": 1}
+
+    manifest.retry([audio_files[1]])
+    assert [audio for audio, _ in manifest.pending("saved", audio_files)] == [audio_files[1]]
+    # A etapa concluída dos demais é mantida.
+    assert len(manifest.pending("indexed", audio_files)) == 2
+
+
+def test_step_exception_consumes_an_attempt(tmp_path, audio_files):
+    manifest = _open(tmp_path, max_attempts=3)
+    manifest.add(audio_files)
+    calls = []
+
+    def step(pending):
+        calls.append(len(pending))
+        raise RuntimeError("Cosmos DB indisponível")
+
+    manifest.record(audio_files[0], "a.json")
+    run_stage(manifest, "indexed", step, audio_files)
+    assert calls == [1, 1, 1]
+    assert manifest.pending("indexed", audio_files) == []
+    assert manifest.summary()["exhausted"] == 1
+
+
+def test_reset_returns_files_to_downloaded(tmp_path, audio_files):
+    manifest = _open(tmp_path)
+    manifest.add(audio_files)
+    manifest.record(audio_files[0], "a.json")
+    manifest.mark(audio_files[0], "uploaded")
+    manifest.reset(audio_files[:1])
+    assert manifest.pending("saved", audio_files[:1]) == [(audio_files[0], "a.json")]
+
+
+def test_migrates_manifest_without_params_column(tmp_path, audio_files):
+    db_path = str(tmp_path / "manifest.sqlite")
+    conn = sqlite3.connect(db_path)
+    conn.execute(
+        "CREATE TABLE files (audio_path TEXT PRIMARY KEY, size INTEGER, mtime REAL,"
+        " stage TEXT NOT NULL, json_file TEXT, attempts INTEGER NOT NULL DEFAULT 0,"
+        " error TEXT, updated_at REAL NOT NULL)"
+    )
+    conn.execute(
+        "INSERT INTO files VALUES (?, 0, 0, 'uploaded', 'a.json', 0, NULL, 0)", (audio_files[0],)
+    )
+    conn.commit()
+    conn.close()
+
+    manifest = RunManifest(db_path, 3, PARAMS)
+    manifest.add(audio_files)
+    assert [audio for audio, _ in manifest.pending("saved", audio_files)] == audio_files
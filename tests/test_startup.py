@@ -0,0 +1,24 @@
+import os
+import subprocess
+import sys
+
+
+APP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "app")
+sys.path.insert(0, APP_DIR)
+
+from benchmark import parse_importtime  # noqa: E402
+
+
+def test_recogni_import_skips_optional_backends():
+    """`import recogni` não deve carregar o SDK do Azure nem o PyTorch."""
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import recogni"],
+        cwd=APP_DIR,
+        capture_output=True,
+        text=True,
+    )
+    assert completed.returncode == 0, completed.stderr
+
+    modules = {name.split(".")[0] for name, _ in parse_importtime(completed.stderr)}
+    assert "azure" not in modules
+    assert "torch" not in modules